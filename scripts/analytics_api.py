@@ -0,0 +1,485 @@
+"""
+Local HTTP API serving the analysis results as JSON or rendered PNGs.
+
+Run from the repository root:
+
+    python -m scripts.analytics_api --port 8000
+
+Endpoints (all GET, `format=json` by default or `format=png`):
+
+    /correlation           ?country=US&features=popularity,danceability&start=2024-01-01&end=2024-06-30
+    /monthly-correlation   ?country=US,MX&features=danceability,energy&target=popularity&start=2024-03-01&end=2024-08-31
+    /explicit-popularity   ?country=US,MX
+    /health
+
+Both formats apply the same parameters. A parameter an endpoint does not
+support is answered with 400 instead of being ignored. The start/end dates
+filter the snapshot dates in the database, so for /monthly-correlation a
+partial month only includes the days in range.
+
+Responses are kept in an in-memory LRU cache with a TTL and carry an ETag
+derived from the table watermark (row count and latest snapshot date), so
+both the cache and the clients' copies are invalidated as soon as new data
+is loaded.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import matplotlib
+matplotlib.use('Agg') # Render figures off-screen, plt.show() becomes a no-op
+import matplotlib.pyplot as plt
+import pandas as pd
+import psycopg.sql as sql
+
+from src.cache import ResponseCache
+from scripts.plot_generation import (
+    NUMERIC_COLS,
+    df_to_corr_matrix,
+    get_db_client,
+    get_explicit_popularity_query,
+    get_heat_map_query,
+    get_monthly_correlation_query,
+    get_monthly_correlations,
+    plot_explicit_popularity_map,
+    plot_heat_map,
+    plot_monthly_correlations,
+)
+
+
+def get_watermark_query() -> str:
+    """
+    Constructs a PostgreSQL query returning the values that change whenever
+    the 'spotify_songs_2024' table is reloaded.
+
+    Returns:
+        str: The SQL query string.
+    """
+    return """
+    SELECT
+        COUNT(*) AS row_count,
+        MAX(snapshot_date) AS max_snapshot_date
+    FROM
+        spotify_songs_2024;
+    """
+
+def get_filtered_heat_map_query(
+        features: List[str],
+        country: Optional[str] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None
+        ) -> sql.Composed:
+    """
+    Wraps `get_heat_map_query` so that only the requested columns and rows are
+    transferred from the database.
+
+    Args:
+        features (List[str]): Columns to select.
+        country (Optional[str]): ISO 3166-1 alpha-2 country code to keep.
+        start (Optional[date]): First snapshot date to keep (inclusive).
+        end (Optional[date]): Last snapshot date to keep (inclusive).
+
+    Returns:
+        sql.Composed: The composed SQL query.
+    """
+    conditions = []
+    if country:
+        conditions.append(sql.SQL("country = {}").format(sql.Literal(country)))
+    if start:
+        conditions.append(sql.SQL("snapshot_date >= {}").format(sql.Literal(start)))
+    if end:
+        conditions.append(sql.SQL("snapshot_date <= {}").format(sql.Literal(end)))
+
+    return sql.SQL("SELECT {columns} FROM ({base}) AS base WHERE {conditions}").format(
+        columns=sql.SQL(', ').join(sql.Identifier(feature) for feature in features),
+        base=sql.SQL(get_heat_map_query()),
+        conditions=sql.SQL(' AND ').join(conditions) if conditions else sql.SQL('TRUE')
+    )
+
+def get_filtered_monthly_correlation_query(start: Optional[date] = None, end: Optional[date] = None) -> str:
+    """
+    Restricts `get_monthly_correlation_query` to a snapshot date range by
+    filling its `{date_filter}` placeholder.
+
+    The bounds are rendered as literals, so the result is still a plain query
+    string with the `{feature_col}`/`{target_col}` placeholders and the
+    country parameter expected by `get_monthly_correlations` and
+    `plot_monthly_correlations`.
+
+    Args:
+        start (Optional[date]): First snapshot date to keep (inclusive).
+        end (Optional[date]): Last snapshot date to keep (inclusive).
+
+    Returns:
+        str: The SQL query string.
+    """
+    conditions = [
+        sql.SQL("AND snapshot_date {operator} {value}").format(operator=sql.SQL(operator), value=sql.Literal(value))
+        for operator, value in (('>=', start), ('<=', end)) if value
+    ]
+    return sql.SQL(get_monthly_correlation_query()).format(
+        # Kept as placeholders for `get_monthly_correlations`
+        feature_col=sql.SQL('{feature_col}'),
+        target_col=sql.SQL('{target_col}'),
+        date_filter=sql.SQL(' ').join(conditions)
+    ).as_string()
+
+def _get_list(params: Dict[str, List[str]], name: str) -> List[str]:
+    """
+    Returns a comma separated query parameter as a list of non-empty values.
+    """
+    values = []
+    for raw in params.get(name, []):
+        values.extend(value.strip() for value in raw.split(',') if value.strip())
+    return values
+
+def _get_date(params: Dict[str, List[str]], name: str) -> Optional[date]:
+    """
+    Returns a query parameter parsed as an ISO date, or None if absent.
+    """
+    values = params.get(name)
+    if not values:
+        return None
+    try:
+        return date.fromisoformat(values[0])
+    except ValueError:
+        raise ValueError(f"Parameter '{name}' must be a date in YYYY-MM-DD format.")
+
+def _get_features(params: Dict[str, List[str]], default: List[str]) -> List[str]:
+    """
+    Returns the requested features, checking that they are numeric columns.
+    """
+    features = _get_list(params, 'features') or default
+    invalid = [feature for feature in features if feature not in NUMERIC_COLS]
+    if invalid:
+        raise ValueError(f"Unknown or non-numeric features: {invalid}. Valid features: {NUMERIC_COLS}")
+    return features
+
+def _render_png(plot_function, **kwargs) -> bytes:
+    """
+    Calls one of the plotting functions with a temporary `save_path` and
+    returns the bytes of the image it saved.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        plot_function(save_path=os.path.join(tmp_dir, 'figure'), **kwargs)
+        plt.close('all')
+
+        saved_files = glob.glob(os.path.join(tmp_dir, '*'))
+        if not saved_files:
+            raise LookupError("No data to plot for the requested parameters.")
+        with open(saved_files[0], 'rb') as f:
+            return f.read()
+
+
+class AnalyticsService:
+    """
+    Computes the API responses from the database and caches them.
+
+    Cache misses are computed one at a time: it avoids running the same
+    expensive query several times when identical requests arrive together,
+    and matplotlib is not thread-safe anyway.
+    """
+
+    def __init__(self, db_client, cache: ResponseCache, watermark_interval: float = 30):
+        """
+        Initializes the AnalyticsService.
+
+        Args:
+            db_client (DatabaseClient): Client used to fetch the data.
+            cache (ResponseCache): Cache holding the computed responses.
+            watermark_interval (float): Minimum number of seconds between two
+                                        checks of the table watermark. Defaults to 30.
+        """
+        self.db_client = db_client
+        self.cache = cache
+        self.watermark_interval = watermark_interval
+        self._watermark = None
+        self._watermark_checked_at = 0.0
+        self._compute_lock = threading.Lock()
+        self._watermark_lock = threading.Lock()
+
+    def get_watermark(self) -> str:
+        """
+        Returns the current table watermark, querying it at most once every
+        `watermark_interval` seconds, and invalidates the cache if it changed.
+
+        The query does not take `_compute_lock`, so a refresh never waits for
+        a response being rendered.
+        """
+        with self._watermark_lock:
+            if self._watermark is None or time.monotonic() - self._watermark_checked_at > self.watermark_interval:
+                df = self.db_client.get_data(get_watermark_query())
+                row = df.iloc[0]
+                self._watermark = f"{row['row_count']}:{row['max_snapshot_date']}"
+                self._watermark_checked_at = time.monotonic()
+
+            if self.cache.invalidate_if_stale(self._watermark):
+                print(f"Data watermark is now {self._watermark}. Response cache cleared.")
+            return self._watermark
+
+    def get_response(self, endpoint: str, params: Dict[str, List[str]]) -> Tuple[bytes, str, bool]:
+        """
+        Returns the body and content type for a request, from the cache if possible.
+
+        Returns:
+            Tuple[bytes, str, bool]: The body, its content type and whether it
+                was served from the cache.
+        """
+        key = self.get_cache_key(endpoint, params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached[0], cached[1], True
+
+        with self._compute_lock:
+            # Another thread may have computed it while we were waiting
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached[0], cached[1], True
+
+            body, content_type = self.compute(endpoint, params)
+            self.cache.set(key, (body, content_type))
+            return body, content_type, False
+
+    @staticmethod
+    def get_cache_key(endpoint: str, params: Dict[str, List[str]]) -> str:
+        """
+        Builds a cache key that does not depend on the parameter order.
+        """
+        return endpoint + '?' + '&'.join(
+            f"{name}={','.join(values)}" for name, values in sorted(params.items())
+        )
+
+    ENDPOINTS = ('/correlation', '/monthly-correlation', '/explicit-popularity')
+
+    # Query parameters accepted by each endpoint. Anything else is rejected, so
+    # an ignored parameter never creates a separate cache entry or ETag.
+    ENDPOINT_PARAMS = {
+        '/correlation': {'format', 'country', 'features', 'start', 'end'},
+        '/monthly-correlation': {'format', 'country', 'features', 'target', 'start', 'end'},
+        '/explicit-popularity': {'format', 'country'},
+    }
+
+    @classmethod
+    def validate_params(cls, endpoint: str, params: Dict[str, List[str]]) -> None:
+        """
+        Checks that every query parameter is supported by the endpoint.
+
+        Raises:
+            ValueError: If a parameter is not supported.
+        """
+        unsupported = sorted(set(params) - cls.ENDPOINT_PARAMS[endpoint])
+        if unsupported:
+            raise ValueError(
+                f"Unsupported parameter(s) for {endpoint}: {unsupported}. "
+                f"Supported: {sorted(cls.ENDPOINT_PARAMS[endpoint])}"
+            )
+
+    def compute(self, endpoint: str, params: Dict[str, List[str]]) -> Tuple[bytes, str]:
+        """
+        Dispatches the request to the matching endpoint.
+
+        Raises:
+            KeyError: If the endpoint does not exist.
+            ValueError: If a parameter is invalid.
+        """
+        endpoints = {
+            '/correlation': self.correlation,
+            '/monthly-correlation': self.monthly_correlation,
+            '/explicit-popularity': self.explicit_popularity,
+        }
+        if endpoint not in endpoints:
+            raise KeyError(endpoint)
+        self.validate_params(endpoint, params)
+
+        output_format = params.get('format', ['json'])[0]
+        if output_format not in ('json', 'png'):
+            raise ValueError("Parameter 'format' must be 'json' or 'png'.")
+
+        return endpoints[endpoint](params, output_format)
+
+    def correlation(self, params: Dict[str, List[str]], output_format: str) -> Tuple[bytes, str]:
+        """
+        Correlation matrix of the requested features for one country and date range.
+        """
+        features = _get_features(params, NUMERIC_COLS)
+        countries = _get_list(params, 'country')
+        if len(countries) > 1:
+            raise ValueError("Parameter 'country' accepts a single country for /correlation.")
+        country = countries[0] if countries else None
+        start, end = _get_date(params, 'start'), _get_date(params, 'end')
+
+        corr_matrix = df_to_corr_matrix(
+            db_client=self.db_client,
+            query=get_filtered_heat_map_query(features, country, start, end),
+            col_2_corr=features,
+            numeric_cols=NUMERIC_COLS
+        )
+
+        if output_format == 'png':
+            row_filters = {key: value for key, value in
+                           (('country', country), ('start', start), ('end', end)) if value}
+            return _render_png(plot_heat_map, corr_matrix=corr_matrix, row_filters=row_filters), 'image/png'
+
+        return corr_matrix.to_json(orient='split').encode(), 'application/json'
+
+    def monthly_correlation(self, params: Dict[str, List[str]], output_format: str) -> Tuple[bytes, str]:
+        """
+        Monthly correlation of each feature against the target, per country.
+        """
+        target_col = params.get('target', ['popularity'])[0]
+        if target_col not in NUMERIC_COLS:
+            raise ValueError(f"Unknown or non-numeric target: '{target_col}'.")
+        features = _get_features(params, [col for col in NUMERIC_COLS if col != target_col])
+        countries = _get_list(params, 'country') or ['ZZ']
+        start, end = _get_date(params, 'start'), _get_date(params, 'end')
+        query = get_filtered_monthly_correlation_query(start, end)
+
+        if output_format == 'png':
+            body = _render_png(
+                plot_monthly_correlations,
+                db_client=self.db_client,
+                query=query,
+                target_country_values=countries,
+                features_to_correlate=features,
+                target_col=target_col,
+                correlation_threshold=0
+            )
+            return body, 'image/png'
+
+        frames = []
+        for country in countries:
+            for feature in features:
+                df = get_monthly_correlations(self.db_client, query, country, feature, target_col)
+                frames.append(df.assign(country=country, feature=feature, target=target_col))
+        monthly = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+        return monthly.to_json(orient='records').encode(), 'application/json'
+
+    def explicit_popularity(self, params: Dict[str, List[str]], output_format: str) -> Tuple[bytes, str]:
+        """
+        Average popularity of explicit songs per country.
+        """
+        df = self.db_client.get_data(get_explicit_popularity_query())
+        countries = _get_list(params, 'country')
+        if countries and not df.empty:
+            df = df[df['country'].isin(countries)]
+
+        if output_format == 'png':
+            if df.empty:
+                raise LookupError("No data to plot for the requested parameters.")
+            body = _render_png(
+                plot_explicit_popularity_map,
+                db_client=self.db_client,
+                explicit_popularity_query=get_explicit_popularity_query(),
+                df_explicit_popularity=df
+            )
+            return body, 'image/png'
+
+        return df.to_json(orient='records').encode(), 'application/json'
+
+
+def make_handler(service: AnalyticsService):
+    """
+    Builds the request handler class bound to `service`.
+    """
+
+    class AnalyticsRequestHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            started_at = time.perf_counter()
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+
+            if url.path == '/health':
+                self._send(200, json.dumps({'status': 'ok'}).encode(), 'application/json')
+                return
+
+            if url.path not in service.ENDPOINTS:
+                self._send_error(404, f"Unknown endpoint '{url.path}'.")
+                return
+
+            try:
+                service.validate_params(url.path, params)
+                watermark = service.get_watermark()
+                etag = '"' + hashlib.sha1(
+                    f"{watermark}|{service.get_cache_key(url.path, params)}".encode()
+                ).hexdigest() + '"'
+
+                # The response only depends on the parameters and the data watermark
+                if self.headers.get('If-None-Match') == etag:
+                    self._send(304, b'', None, {'ETag': etag})
+                    return
+
+                body, content_type, cache_hit = service.get_response(url.path, params)
+            except (ValueError, LookupError) as e:
+                self._send_error(400, str(e))
+                return
+            except Exception as e:
+                print(f"An unexpected error occurred: {e}")
+                self._send_error(500, 'Internal server error.')
+                return
+
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+            self._send(200, body, content_type, {
+                'ETag': etag,
+                'Cache-Control': 'no-cache', # Clients revalidate with If-None-Match
+                'X-Cache': 'HIT' if cache_hit else 'MISS',
+                'Server-Timing': f"total;dur={elapsed_ms:.1f}",
+            })
+
+        def _send_error(self, status: int, message: str):
+            self._send(status, json.dumps({'error': message}).encode(), 'application/json')
+
+        def _send(self, status: int, body: bytes, content_type: Optional[str], headers: Optional[Dict[str, str]] = None):
+            self.send_response(status)
+            if content_type:
+                self.send_header('Content-Type', content_type)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return AnalyticsRequestHandler
+
+
+def main() -> None:
+    """
+    Parses the command line arguments and serves the API until interrupted.
+    """
+    parser = argparse.ArgumentParser(description='Local HTTP API for the Spotify analysis results.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to bind. Defaults to 127.0.0.1.')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on. Defaults to 8000.')
+    parser.add_argument('--cache-size', type=int, default=128, help='Maximum number of cached responses.')
+    parser.add_argument('--cache-ttl', type=float, default=600, help='Lifetime of a cached response in seconds.')
+    parser.add_argument('--watermark-interval', type=float, default=30,
+                        help='Seconds between two checks of the table watermark.')
+    args = parser.parse_args()
+
+    service = AnalyticsService(
+        db_client=get_db_client(),
+        cache=ResponseCache(max_entries=args.cache_size, ttl_seconds=args.cache_ttl),
+        watermark_interval=args.watermark_interval
+    )
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Serving the analytics API on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
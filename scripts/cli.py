@@ -0,0 +1,547 @@
+"""
+Command line interface for the Spotify analysis.
+
+Each analysis is a subcommand, so generating one heatmap does not pay for the
+others. Heavy libraries (pandas, matplotlib, seaborn, cartopy...) are only
+imported inside the subcommand that needs them, which keeps `--help` and
+argument errors instant.
+
+Examples:
+    python -m scripts.cli heatmap --country US
+    python -m scripts.cli monthly --countries US,MX --features energy,valence --threshold 0.3
+    python -m scripts.cli map --output output/explicit_popularity_map
+    python -m scripts.cli sweep --target-error 0.05 --sampling stratified
+    python -m scripts.cli heatmap --country MX --sample 0.05
+    python -m scripts.cli --parquet data/spotify_songs_2024.parquet grid --method spearman
+    python -m scripts.cli similar 2plvUZfXrYFnrAPoOiVxHG -k 5 --countries US,MX
+    python -m scripts.cli quality --table spotify_songs
+    python -m scripts.cli ingest data/universal_top_spotify_songs.csv
+"""
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+# Dependency-free, so building the parser does not import pandas
+from src.constants import CORRELATION_METHODS, NUMERIC_COLS, SAMPLING_METHODS
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sql')
+QUALITY_SCRIPTS = {
+    'raw': '07_analize_raw_data_quality.sql',
+    'final': '08_final_data_quality.sql'
+}
+# Both reports read spotify_songs_staging, which sql/04 renames to
+# spotify_songs. `quality` points the final one at a table that still exists.
+QUALITY_TABLES = ('spotify_songs', 'spotify_songs_2024')
+CLEAN_SCRIPT = '03_clean_and_transform_staging.sql'
+FINALIZE_SCRIPTS = [
+    '04_finalize_and_index_main_table.sql',
+    '05_create_2024_table.sql',
+    '06_final_type_adjustments.sql'
+]
+
+
+def comma_list(value: str) -> List[str]:
+    """
+    Parses a comma separated argument such as "US,MX,ES".
+
+    Args:
+        value (str): The raw argument.
+
+    Returns:
+        List[str]: The non-empty, stripped items.
+    """
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def feature_list(value: str) -> List[str]:
+    """
+    Parses a comma separated list of numeric columns such as "energy,valence".
+
+    Args:
+        value (str): The raw argument.
+
+    Returns:
+        List[str]: The column names.
+
+    Raises:
+        argparse.ArgumentTypeError: If a name is not a numeric column of the
+            cleaned table, so argparse reports it instead of failing later.
+    """
+    features = comma_list(value)
+    unknown = [feature for feature in features if feature not in NUMERIC_COLS]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"unknown feature(s) {', '.join(unknown)}; choose from {', '.join(NUMERIC_COLS)}"
+        )
+    if not features:
+        raise argparse.ArgumentTypeError("at least one feature is required")
+    return features
+
+
+def read_sql_file(file_name: str) -> str:
+    """
+    Reads a script from the sql/ directory.
+
+    Args:
+        file_name (str): Name of the file inside sql/.
+
+    Returns:
+        str: The content of the script.
+    """
+    with open(os.path.join(SQL_DIR, file_name), encoding='utf-8') as f:
+        return f.read()
+
+
+def add_sampling_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the options of the approximate mode (see src/sampling.py).
+
+    Args:
+        parser (argparse.ArgumentParser): Subcommand parser.
+    """
+    group = parser.add_argument_group('approximate mode')
+    size = group.add_mutually_exclusive_group()
+    size.add_argument('--sample', type=float, metavar='FRACTION',
+                      help='Correlate a random share of the rows, e.g. 0.05.')
+    size.add_argument('--target-error', type=float, metavar='E',
+                      help='Sample just enough rows for a confidence interval of ±E, e.g. 0.05.')
+    group.add_argument('--sampling', choices=SAMPLING_METHODS, default='bernoulli',
+                       help='TABLESAMPLE BERNOULLI/SYSTEM, or per country and month (default: bernoulli).')
+    group.add_argument('--seed', type=int, default=42, help='Seed of the sample (default: 42).')
+    group.add_argument('--confidence', type=float, default=0.95,
+                       help='Level of the confidence intervals (default: 0.95).')
+
+
+def get_sampling(args: argparse.Namespace) -> Optional[dict]:
+    """
+    Builds the sampling request from the approximate mode options.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments.
+
+    Returns:
+        Optional[dict]: The request, or None for exact results.
+    """
+    if args.sample is None and args.target_error is None:
+        return None
+    if args.csv:
+        sys.exit("--sample/--target-error need a database; drop --csv.")
+
+    return {
+        'method': args.sampling,
+        'fraction': args.sample,
+        'target_error': args.target_error,
+        'seed': args.seed,
+        'confidence': args.confidence
+    }
+
+
+def get_client(args: argparse.Namespace):
+    """
+    Creates the query client selected by the global options.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments. `--parquet` selects the
+            DuckDB backend, otherwise the PostgreSQL credentials from config
+            are used (see `get_db_client` in scripts/plot_generation.py).
+
+    Returns:
+        DatabaseClient or DuckDBClient: A client exposing `get_data`.
+    """
+    if args.parquet:
+        from src.duckdb_client import DuckDBClient
+        return DuckDBClient(args.parquet)
+
+    from scripts.plot_generation import get_db_client
+    return get_db_client()
+
+
+def get_stats(args: argparse.Namespace, columns: List[str]):
+    """
+    Streams the raw Kaggle CSV when `--csv` is given.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments.
+        columns (List[str]): Numeric columns the statistics must cover.
+
+    Returns:
+        StreamingStats or None: The statistics, or None to query a database.
+    """
+    if not args.csv:
+        return None
+    if getattr(args, 'method', 'pearson') != 'pearson':
+        sys.exit("--csv only supports --method pearson.")
+
+    from src.streaming import stream_csv_statistics
+    return stream_csv_statistics(args.csv, columns=columns)
+
+
+def run_heatmap(args: argparse.Namespace) -> None:
+    """
+    Plots the correlation heatmap of the selected features for one country
+    (or every country when `--country` is omitted).
+    """
+    from scripts.plot_generation import df_to_corr_matrix, get_heat_map_query, plot_heat_map
+
+    row_filters = {"country": args.country} if args.country else None
+    sampling = get_sampling(args)
+    stats = get_stats(args, args.features)
+    if stats is not None:
+        corr_matrix = stats.corr_matrix(country=args.country, columns=args.features)
+    else:
+        corr_matrix = df_to_corr_matrix(
+            db_client=get_client(args),
+            query=get_heat_map_query(),
+            row_filters=row_filters,
+            col_2_corr=args.features,
+            numeric_cols=NUMERIC_COLS,
+            method=args.method,
+            sampling=sampling
+        )
+        if sampling is not None:
+            corr_matrix, intervals = corr_matrix
+            print(intervals.to_string(index=False))
+
+    plot_heat_map(corr_matrix, row_filters=row_filters, save_path=args.output)
+
+
+def run_grid(args: argparse.Namespace) -> None:
+    """
+    Plots the small-multiples grid of per-country correlation heatmaps.
+    """
+    from scripts.plot_generation import df_to_corr_stack, get_heat_map_query, plot_heat_map_grid
+
+    corr_stack, countries = df_to_corr_stack(
+        db_client=get_client(args),
+        query=get_heat_map_query(),
+        col_2_corr=args.features,
+        countries=args.countries,
+        method=args.method
+    )
+    plot_heat_map_grid(
+        corr_stack,
+        countries,
+        args.features,
+        annot_threshold=args.annot_threshold,
+        save_path=args.output
+    )
+
+
+def run_monthly(args: argparse.Namespace) -> None:
+    """
+    Plots the monthly correlation of each feature with the target column.
+    """
+    from scripts.plot_generation import get_monthly_correlation_query, plot_monthly_correlations
+
+    features = [feature for feature in args.features if feature != args.target]
+    sampling = get_sampling(args)
+    stats = get_stats(args, features + [args.target])
+
+    plot_monthly_correlations(
+        db_client=get_client(args) if stats is None else None,
+        query=get_monthly_correlation_query(),
+        target_country_values=args.countries,
+        features_to_correlate=features,
+        target_col=args.target,
+        correlation_threshold=args.threshold,
+        save_path=args.output,
+        method=args.method,
+        stats=stats,
+        sampling=sampling
+    )
+
+
+def run_sweep(args: argparse.Namespace) -> None:
+    """
+    Prints the correlation of every feature with the target column in every
+    country, sorted by strength.
+    """
+    import pandas as pd
+    from scripts.plot_generation import sweep_feature_correlations
+
+    df = sweep_feature_correlations(
+        db_client=get_client(args),
+        features=args.features,
+        target_col=args.target,
+        countries=args.countries,
+        method=args.method,
+        sampling=get_sampling(args)
+    )
+    with pd.option_context('display.max_rows', args.top, 'display.width', None):
+        print(df.head(args.top).to_string(index=False))
+
+    if args.output:
+        df.to_csv(args.output, index=False)
+        print(f"Sweep saved to {args.output}")
+
+
+def run_map(args: argparse.Namespace) -> None:
+    """
+    Plots the world map of average popularity of explicit songs.
+    """
+    from scripts.plot_generation import get_explicit_popularity_query, plot_explicit_popularity_map
+
+    stats = get_stats(args, NUMERIC_COLS)
+    plot_explicit_popularity_map(
+        db_client=get_client(args) if stats is None else None,
+        explicit_popularity_query=get_explicit_popularity_query(),
+        save_path=f"{args.output}.png",  # The map function saves to the path as given
+        df_explicit_popularity=stats.explicit_popularity() if stats is not None else None
+    )
+
+
+def run_diffusion(args: argparse.Namespace) -> None:
+    """
+    Plots the cross-country debut lag and co-occurrence matrices.
+    """
+    from scripts.plot_generation import get_first_appearance_query, plot_diffusion_matrices
+
+    plot_diffusion_matrices(
+        db_client=get_client(args),
+        first_appearance_query=get_first_appearance_query(),
+        min_shared=args.min_shared,
+        save_path=args.output
+    )
+
+
+def run_similar(args: argparse.Namespace) -> None:
+    """
+    Prints the songs that sound most like the given ones and how they charted.
+    """
+    import pandas as pd
+    from scripts.plot_generation import find_similar_tracks
+
+    try:
+        df = find_similar_tracks(
+            db_client=get_client(args),
+            track_ids=args.track_ids,
+            k=args.k,
+            feature_cols=args.features,
+            countries=args.countries,
+            index_dir=args.index_dir
+        )
+    except KeyError as e:
+        sys.exit(e.args[0])  # str(e) would wrap the message in quotes
+    with pd.option_context('display.max_rows', None, 'display.width', None):
+        print(df.to_string(index=False))
+
+    if args.output:
+        df.to_csv(args.output, index=False)
+        print(f"Similar tracks saved to {args.output}")
+
+
+def print_report(df, output: Optional[str] = None) -> None:
+    """
+    Prints a data quality report and optionally saves it.
+
+    Args:
+        df (pd.DataFrame): The report.
+        output (Optional[str]): CSV path to save the report to. Defaults to None.
+    """
+    import pandas as pd
+
+    with pd.option_context('display.max_rows', None, 'display.width', None):
+        print(df.to_string(index=False))
+
+    if output:
+        df.to_csv(output, index=False)
+        print(f"Report saved to {output}")
+
+
+def run_quality(args: argparse.Namespace) -> None:
+    """
+    Runs the final data quality report (sql/08) on a cleaned table and prints it.
+
+    The raw report (sql/07) needs the untyped staging table, which only exists
+    while `ingest` runs, so `ingest` prints both reports instead.
+    """
+    if args.parquet:
+        sys.exit("quality reads PostgreSQL tables; drop --parquet.")
+
+    import psycopg.sql as sql
+
+    query = sql.SQL(
+        read_sql_file(QUALITY_SCRIPTS['final']).replace('spotify_songs_staging', '{table}')
+    ).format(table=sql.Identifier(args.table))
+    print_report(get_client(args).get_data(query), args.output)
+
+
+def run_ingest(args: argparse.Namespace) -> None:
+    """
+    Loads the raw Kaggle CSV into PostgreSQL and builds the cleaned tables.
+
+    Replaces sql/02_ingest_raw_data.sql, whose COPY reads a hard-coded path on
+    the database server, with a client-side COPY FROM STDIN of `csv_path`.
+    The quality reports run while the staging table they read still exists:
+    the raw one (sql/07) right after the COPY, the final one (sql/08) after
+    the cleaning and before sql/04 renames the table.
+
+    Running it again replaces the tables of the previous run.
+    """
+    if args.parquet:
+        sys.exit("ingest loads PostgreSQL; drop --parquet.")
+
+    from src.streaming import CSV_COLUMNS
+
+    report_paths = {}
+    if args.report_dir:
+        os.makedirs(args.report_dir, exist_ok=True)
+        report_paths = {stage: os.path.join(args.report_dir, f"{stage}_quality.csv") for stage in QUALITY_SCRIPTS}
+
+    db_client = get_client(args)
+    # sql/04 renames the staging table to spotify_songs, which fails if it
+    # exists. It is dropped before sql/01 because it keeps the sequence and
+    # primary key names of the staging table, which sql/01 creates again.
+    db_client.execute("DROP TABLE IF EXISTS spotify_songs;")
+    db_client.execute(read_sql_file('01_create_staging_table.sql'))
+    db_client.copy_csv('spotify_songs_staging', CSV_COLUMNS, args.csv_path)
+    print(f"Running {QUALITY_SCRIPTS['raw']}...")
+    print_report(db_client.get_data(read_sql_file(QUALITY_SCRIPTS['raw'])), report_paths.get('raw'))
+
+    print(f"Running {CLEAN_SCRIPT}...")
+    db_client.execute(read_sql_file(CLEAN_SCRIPT))
+    print(f"Running {QUALITY_SCRIPTS['final']}...")
+    print_report(db_client.get_data(read_sql_file(QUALITY_SCRIPTS['final'])), report_paths.get('final'))
+
+    for file_name in FINALIZE_SCRIPTS:
+        print(f"Running {file_name}...")
+        db_client.execute(read_sql_file(file_name))
+
+    if args.export_parquet:
+        from src.duckdb_client import export_table_to_parquet
+        export_table_to_parquet(db_client, args.export_parquet)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Builds the argument parser with one subcommand per analysis.
+
+    Returns:
+        argparse.ArgumentParser: The parser. Each subparser stores its handler
+            in `func`.
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m scripts.cli',
+        description='Spotify top songs analysis.'
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument(
+        '--parquet', metavar='PATH', default=os.environ.get('SPOTIFY_PARQUET_PATH'),
+        help='Query a Parquet export with DuckDB instead of PostgreSQL (default: $SPOTIFY_PARQUET_PATH).'
+    )
+    source.add_argument(
+        '--csv', metavar='PATH', default=os.environ.get('SPOTIFY_CSV_PATH'),
+        help='Stream the raw Kaggle CSV without a database. Only heatmap, monthly and map '
+             'support it (default: $SPOTIFY_CSV_PATH).'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    parser.set_defaults(supports_csv=False)
+
+    heatmap = subparsers.add_parser('heatmap', help='Correlation heatmap for one country.')
+    heatmap.add_argument('--country', help='Country code, e.g. US. All rows when omitted.')
+    heatmap.add_argument('--features', type=feature_list, default=NUMERIC_COLS,
+                         help='Comma separated columns to correlate (default: all numeric).')
+    heatmap.add_argument('--method', choices=CORRELATION_METHODS, default='pearson')
+    heatmap.add_argument('--output', default='output/heatmap', help='Path without extension.')
+    add_sampling_arguments(heatmap)
+    heatmap.set_defaults(func=run_heatmap, supports_csv=True)
+
+    grid = subparsers.add_parser('grid', help='Correlation heatmaps of many countries in one figure.')
+    grid.add_argument('--countries', type=comma_list, help='Comma separated country codes (default: all).')
+    grid.add_argument('--features', type=feature_list, default=NUMERIC_COLS,
+                      help='Comma separated columns to correlate (default: all numeric).')
+    grid.add_argument('--method', choices=CORRELATION_METHODS, default='pearson')
+    grid.add_argument('--annot-threshold', type=float,
+                      help='Only annotate cells whose absolute value reaches this threshold.')
+    grid.add_argument('--output', default='output/heatmap_grid', help='Path without extension.')
+    grid.set_defaults(func=run_grid)
+
+    monthly = subparsers.add_parser('monthly', help='Monthly correlation of features with a target column.')
+    monthly.add_argument('--countries', type=comma_list, default=['US'],
+                         help='Comma separated country codes (default: US).')
+    monthly.add_argument('--features', type=feature_list, default=NUMERIC_COLS,
+                         help='Comma separated features (default: all numeric).')
+    monthly.add_argument('--target', default='popularity', choices=NUMERIC_COLS, metavar='COLUMN',
+                         help='Target column (default: popularity).')
+    monthly.add_argument('--threshold', type=float, default=0,
+                         help='Only plot features whose correlation reaches this value (default: 0).')
+    monthly.add_argument('--method', choices=CORRELATION_METHODS, default='pearson')
+    monthly.add_argument('--output', default='output/monthly_correlations', help='Path prefix.')
+    add_sampling_arguments(monthly)
+    monthly.set_defaults(func=run_monthly, supports_csv=True)
+
+    sweep = subparsers.add_parser('sweep', help='Correlation of every feature with a target column in every country.')
+    sweep.add_argument('--countries', type=comma_list, help='Comma separated country codes (default: all).')
+    sweep.add_argument('--features', type=feature_list, default=NUMERIC_COLS,
+                       help='Comma separated features (default: all numeric).')
+    sweep.add_argument('--target', default='popularity', choices=NUMERIC_COLS, metavar='COLUMN',
+                       help='Target column (default: popularity).')
+    sweep.add_argument('--method', choices=CORRELATION_METHODS, default='pearson')
+    sweep.add_argument('--top', type=int, default=30, help='Rows to print (default: 30).')
+    sweep.add_argument('--output', help='Optional CSV path to save every combination.')
+    add_sampling_arguments(sweep)
+    sweep.set_defaults(func=run_sweep)
+
+    world_map = subparsers.add_parser('map', help='World map of explicit songs popularity.')
+    world_map.add_argument('--output', default='output/explicit_popularity_map', help='Path without extension.')
+    world_map.set_defaults(func=run_map, supports_csv=True)
+
+    diffusion = subparsers.add_parser('diffusion', help='Debut lag and shared songs between countries.')
+    diffusion.add_argument('--min-shared', type=int, default=5,
+                           help='Minimum shared songs to report a lag (default: 5).')
+    diffusion.add_argument('--output', default='output/diffusion', help='Path prefix.')
+    diffusion.set_defaults(func=run_diffusion)
+
+    similar = subparsers.add_parser('similar', help='Songs that sound most like the given ones.')
+    similar.add_argument('track_ids', nargs='+', help='spotify_id of the reference songs.')
+    similar.add_argument('-k', type=int, default=10, help='Similar songs per reference song (default: 10).')
+    similar.add_argument('--features', type=feature_list,
+                         default=['danceability', 'energy', 'valence', 'tempo', 'loudness'],
+                         help='Comma separated audio features (default: danceability,energy,valence,tempo,loudness).')
+    similar.add_argument('--countries', type=comma_list, help='Comma separated country codes (default: all).')
+    similar.add_argument('--index-dir', default='output/similarity_index',
+                         help='Directory of the persisted index, rebuilt when the songs change.')
+    similar.add_argument('--output', help='Optional CSV path to save the result.')
+    similar.set_defaults(func=run_similar)
+
+    quality = subparsers.add_parser(
+        'quality', help='Print the final data quality report (sql/08) of a cleaned table.'
+    )
+    quality.add_argument('--table', choices=QUALITY_TABLES, default='spotify_songs_2024',
+                         help='Cleaned table to check (default: spotify_songs_2024). The raw '
+                              'report (sql/07) is printed by ingest.')
+    quality.add_argument('--output', help='Optional CSV path to save the report.')
+    quality.set_defaults(func=run_quality)
+
+    ingest = subparsers.add_parser('ingest', help='Load the raw CSV into PostgreSQL and clean it.')
+    ingest.add_argument('csv_path', help='Path to universal_top_spotify_songs.csv.')
+    ingest.add_argument('--report-dir', metavar='DIR',
+                        help='Also save the raw and final quality reports as CSV files in DIR.')
+    ingest.add_argument('--export-parquet', metavar='PATH',
+                        help='Also export the cleaned table to Parquet for the DuckDB backend.')
+    ingest.set_defaults(func=run_ingest)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Parses the command line and runs the selected subcommand.
+
+    Args:
+        argv (Optional[List[str]]): Arguments, defaults to sys.argv[1:].
+    """
+    args = build_parser().parse_args(argv)
+
+    # The environment variable defaults bypass the mutually exclusive group
+    if args.parquet and args.csv:
+        sys.exit("Choose one data source: --parquet/SPOTIFY_PARQUET_PATH or --csv/SPOTIFY_CSV_PATH.")
+    if args.csv and not args.supports_csv:
+        sys.exit(f"{args.command} needs a database; drop --csv/SPOTIFY_CSV_PATH.")
+
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,22 @@
 
-from config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
 from src.db_client import DatabaseClient
-from src.utils import high_contrast_color
+from src.diffusion import build_first_appearance_matrix, compute_diffusion_matrices
+from src.constants import CORRELATION_METHODS, NUMERIC_COLS
+from src.correlation import correlation_matrix, grouped_correlation_matrix, pairwise_correlation
+from src.streaming import StreamingStats, stream_csv_statistics
+from src.sampling import confidence_interval, pairwise_counts, required_sample_size, resolve_sampling, sample_fraction
 import pandas as pd
-from typing import Optional, Dict, List
-import matplotlib.pyplot as plt
-import seaborn as sns
-import pycountry
+import numpy as np
+import math
+from typing import Optional, Dict, List, Tuple, Union
 import re
+import os
 import psycopg.sql as sql
 from datetime import datetime
-import matplotlib.cm as cm
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
-import cartopy.io.shapereader as shpreader
-import matplotlib.colors as mcolors
 
+# matplotlib, seaborn, pycountry and cartopy are slow to import, so each
+# plotting function imports only what it draws with. Computing data or
+# drawing a heatmap therefore never loads cartopy/shapely.
 
 def get_heat_map_query() -> str:
     """
@@ -40,8 +41,10 @@ def df_to_corr_matrix(
         query: str,
         row_filters: Optional[Dict[str,any]] = None,
         col_2_corr: Optional[List[str]] = None,
-        numeric_cols: Optional[List[str]] = None
-        ) -> pd.DataFrame:
+        numeric_cols: Optional[List[str]] = None,
+        method: str = 'pearson',
+        sampling: Optional[Dict[str, any]] = None
+        ) -> Union[pd.DataFrame, Tuple[pd.DataFrame, pd.DataFrame]]:
     
     """
     Retrieves data from a database, filters it by rows and columns,
@@ -68,12 +71,28 @@ def df_to_corr_matrix(
             before attempting correlation calculation. If `None`, this validation
             step is skipped (though `col_2_corr` still needs to be numeric in practice).
             Defaults to `None`.
+        method (str, optional): Correlation method, one of 'pearson',
+            'spearman' or 'kendall' (tau-b). The rank methods suit ordinal
+            columns such as `daily_rank` (see src/correlation.py).
+            Defaults to 'pearson'.
+        sampling (Optional[Dict[str, any]], optional): Approximate mode.
+            For example, `{"method": "bernoulli", "fraction": 0.05}` or
+            `{"method": "stratified", "target_error": 0.05}` (see
+            src/sampling.py). The rows are then fetched with
+            `get_sampled_heat_map_query`, with the row filters applied by
+            the database, and `query` is ignored. If `None`, the exact
+            matrix is computed. Defaults to `None`.
 
     Returns:
-        pd.DataFrame: A pandas DataFrame representing the correlation matrix
-            of the filtered and selected numeric columns. Returns an empty
-            DataFrame or raises an error if correlation cannot be calculated
-            due to missing or non-numeric columns.
+        Union[pd.DataFrame, Tuple[pd.DataFrame, pd.DataFrame]]: A pandas
+            DataFrame representing the correlation matrix of the filtered and
+            selected numeric columns. Returns an empty DataFrame or raises an
+            error if correlation cannot be calculated due to missing or
+            non-numeric columns. In approximate mode, a tuple of the matrix
+            and a long-form DataFrame with one row per pair of columns:
+            'feature_1', 'feature_2', 'correlation', 'n' (rows behind the
+            cell) and the 'ci_low' and 'ci_high' bounds of its confidence
+            interval.
 
     Prints:
         - A warning if a column specified in `row_filters` does not exist in the DataFrame.
@@ -81,6 +100,24 @@ def df_to_corr_matrix(
           does not exist in the DataFrame after row filtering.
         - A confirmation message if the correlation matrix is successfully calculated.
     """
+    sampling = resolve_sampling(sampling)
+    if sampling is not None:
+        # Push the row filters to the database so only the sampled rows of interest are transferred
+        where = sql.SQL('')
+        if row_filters:
+            where = sql.SQL("WHERE ") + sql.SQL(" AND ").join(
+                # Boolean flags such as is_explicit are stored as integers
+                sql.SQL("{col} = {val}").format(
+                    col=sql.Identifier(col), val=sql.Literal(int(val) if isinstance(val, bool) else val)
+                )
+                for col, val in row_filters.items()
+            )
+        countries = [row_filters["country"]] if row_filters and "country" in row_filters else None
+        query = sql.SQL(get_sampled_heat_map_query()).format(
+            source=get_sample_source(db_client, sampling, countries=countries, method=method, where=where),
+            where=where
+        )
+
     #call get_data method on DatabaseClient object to retrieve the dataframe
     df = db_client.get_data(query)
 
@@ -105,8 +142,29 @@ def df_to_corr_matrix(
         df_final = df_rows_filtered.loc[:, col_2_corr].copy()
         
         # This is the second fix: Move the correlation calculation inside the if block
-        corr_matrix = df_final.corr()
-        
+        corr_matrix = correlation_matrix(df_final, method)
+
+        if sampling is not None:
+            rows, cols = np.triu_indices(len(col_2_corr), k=1)
+            correlations = corr_matrix.to_numpy(dtype=float)[rows, cols]
+            n = pairwise_counts(df_final).to_numpy()[rows, cols]
+            ci_low, ci_high = confidence_interval(correlations, n, sampling['confidence'], method)
+            intervals = pd.DataFrame({
+                'feature_1': corr_matrix.index[rows],
+                'feature_2': corr_matrix.columns[cols],
+                'correlation': correlations,
+                'n': n,
+                'ci_low': ci_low,
+                'ci_high': ci_high
+            })
+            print(
+                f"Approximate correlation matrix from {len(df_final)} sampled rows, "
+                f"{sampling['confidence']:.0%} CI half-width up to "
+                f"±{(intervals['ci_high'] - intervals['ci_low']).max() / 2:.3f}:"
+            )
+            print(corr_matrix)
+            return corr_matrix, intervals
+
         print("Correlation Matrix successfully calculated:")
         print(corr_matrix)
         return corr_matrix # Return an empty DataFrame if correlation cannot be calculated
@@ -116,7 +174,11 @@ def df_to_corr_matrix(
 def plot_heat_map(
     corr_matrix: pd.DataFrame,
     row_filters: Optional[Dict[str, any]] = None,
-    save_path: Optional[str] = 'output/heatmap'
+    save_path: Optional[str] = 'output/heatmap',
+    title: str = 'Correlation Matrix of Numeric Spotify Song Features',
+    cbar_label: str = 'Correlation Coefficient',
+    fmt: str = '.2f',
+    annot: bool = True
 ) -> None:
     
     """
@@ -137,10 +199,20 @@ def plot_heat_map(
             converted to the full country name for the plot title. If `None` or
             empty, the title will not include any filter information.
             Defaults to `None`.
+        save_path (Optional[str]): Prefix of the saved PNG file. The applied
+            filters are appended to it. Defaults to 'output/heatmap'.
+        title (str): Main title of the plot. Defaults to
+            'Correlation Matrix of Numeric Spotify Song Features'.
+        cbar_label (str): Label of the colorbar. Defaults to 'Correlation Coefficient'.
+        fmt (str): Format string for the cell annotations. Defaults to '.2f'.
+        annot (bool): Whether to write the value inside each cell. Defaults to `True`.
 
     Returns:
         None: This function displays the plot directly and does not return any value.
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import pycountry
 
     if corr_matrix.empty:
         print("Warning: Correlation matrix is empty. Skipping heatmap plot.")
@@ -149,12 +221,12 @@ def plot_heat_map(
     plt.figure(figsize=(14, 12))  # Increased figure size for better readability
     sns.heatmap(
         corr_matrix, 
-        annot=True,  
+        annot=annot,  
         cmap='vlag', 
-        fmt=".2f",  
+        fmt=fmt,  
         #linewidths=.5,  # Add lines between cells.
         linecolor='gray', 
-        cbar_kws={'label': 'Correlation Coefficient', 'shrink': 0.8}, 
+        cbar_kws={'label': cbar_label, 'shrink': 0.8}, 
         annot_kws={"fontsize": 9, "weight": "bold"} 
     )
 
@@ -178,12 +250,12 @@ def plot_heat_map(
         # Build subtitle and set title
         plain_text = ' | '.join(f"{key}: {value}" for key, value in title_filters.items())
         plt.title(
-            f'Correlation Matrix of Numeric Spotify Song Features\n Applied Filters -> ({plain_text})',
+            f'{title}\n Applied Filters -> ({plain_text})',
             fontsize=14, pad=20, weight='bold'
         )
     else:
         plt.title(
-            "Correlation Matrix of Numeric Spotify Song Features",
+            title,
             fontsize=14, pad=20, weight='bold'
         )
         plain_text = "no_filters"
@@ -204,13 +276,170 @@ def plot_heat_map(
     plt.savefig(f"{save_path}_{re.sub(r'[^a-zA-Z0-9]', '_', plain_text)}.png", dpi=300, bbox_inches='tight')
     plt.show()
 
+def df_to_corr_stack(
+        db_client: DatabaseClient,
+        query: str,
+        col_2_corr: List[str],
+        countries: Optional[List[str]] = None,
+        method: str = 'pearson'
+        ) -> Tuple[np.ndarray, List[str]]:
+    """
+    Retrieves data from a database once and calculates the correlation matrix
+    of the specified columns for every country.
+
+    Args:
+        db_client (DatabaseClient): An instance of a database client object
+            with a `get_data` method that returns a pandas DataFrame.
+        query (str): The SQL query string to execute via `db_client.get_data`.
+            The result must contain a 'country' column and all `col_2_corr`.
+        col_2_corr (List[str]): Numeric columns to correlate.
+        countries (Optional[List[str]]): Country codes to keep, in the order
+            they should be stacked. If `None`, every country found in the
+            data is used, sorted by code. Defaults to `None`.
+        method (str): Correlation method, one of 'pearson', 'spearman' or
+            'kendall'. Defaults to 'pearson'.
+
+    Returns:
+        Tuple[np.ndarray, List[str]]: A float32 array of shape
+            (n_countries, n_features, n_features) and the matching country codes.
+    """
+    df = db_client.get_data(query)
+
+    if countries is None:
+        countries = sorted(df['country'].unique())
+
+    # One grouped call computes all the per-country matrices
+    grouped_corr = grouped_correlation_matrix(
+        df.loc[df['country'].isin(countries), ['country'] + col_2_corr], 'country', col_2_corr, method
+    )
+
+    corr_stack = np.full((len(countries), len(col_2_corr), len(col_2_corr)), np.nan, dtype=np.float32)
+    for i, country in enumerate(countries):
+        if country in grouped_corr.index.get_level_values(0):
+            corr_stack[i] = grouped_corr.loc[country].loc[col_2_corr, col_2_corr].to_numpy()
+        else:
+            print(f"Warning: No data for country '{country}'. Its matrix is left empty.")
+
+    print(f"Correlation matrices calculated for {len(countries)} countries.")
+    return corr_stack, list(countries)
+
+def plot_heat_map_grid(
+    corr_stack: np.ndarray,
+    countries: List[str],
+    features: List[str],
+    annot_threshold: Optional[float] = None,
+    ncols: Optional[int] = None,
+    save_path: str = 'output/heatmap_grid',
+    dpi: int = 150
+) -> None:
+    """
+    Renders one small correlation heatmap per country in a single figure.
+
+    All panels share the same color scale (-1 to 1) and a single colorbar.
+    Cells are drawn with `imshow`, which is much cheaper than one seaborn
+    figure per country, and only the coefficients whose absolute value is at
+    least `annot_threshold` are written. The stacked array is also saved next
+    to the image as a compressed .npz file (keys: 'corr', 'countries',
+    'features') so it can be reloaded without querying the database.
+
+    Args:
+        corr_stack (np.ndarray): Array of shape (n_countries, n_features,
+            n_features), as returned by `df_to_corr_stack`.
+        countries (List[str]): ISO 3166-1 alpha-2 codes of the stacked matrices.
+        features (List[str]): Names of the correlated columns.
+        annot_threshold (Optional[float]): Minimum absolute correlation for a
+            cell to be annotated. If `None`, no cell is annotated. Diagonal
+            cells are never annotated. Defaults to `None`.
+        ncols (Optional[int]): Number of panels per row. Defaults to a
+            roughly square grid.
+        save_path (str): Path of the saved files, without extension.
+            Defaults to 'output/heatmap_grid'.
+        dpi (int): Resolution of the saved image. Defaults to 150.
+    """
+    import matplotlib.colors as mcolors
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import pycountry
+    from src.utils import high_contrast_color
+
+    if corr_stack.size == 0:
+        print("Warning: Correlation stack is empty. Skipping heatmap grid plot.")
+        return
+
+    np.savez_compressed(
+        f"{save_path}.npz",
+        corr=corr_stack,
+        countries=np.array(countries),
+        features=np.array(features)
+    )
+
+    n_panels = len(countries)
+    ncols = ncols or math.ceil(math.sqrt(n_panels))
+    nrows = math.ceil(n_panels / ncols)
+
+    cmap = sns.color_palette('vlag', as_cmap=True)
+    norm = mcolors.Normalize(vmin=-1, vmax=1)
+    ticks = np.arange(len(features))
+    tick_labels = [feature.replace('_', ' ') for feature in features]
+
+    fig, axes = plt.subplots(nrows, ncols, figsize=(2.4 * ncols, 2.4 * nrows), squeeze=False)
+
+    for i, ax in enumerate(axes.flat):
+        if i >= n_panels:
+            ax.axis('off')  # Hide the unused panels of the last row
+            continue
+
+        image = ax.imshow(corr_stack[i], cmap=cmap, norm=norm, interpolation='nearest')
+
+        if countries[i] == "ZZ":
+            country_name = "Global"
+        else:
+            country = pycountry.countries.get(alpha_2=countries[i])
+            country_name = country.name if country else countries[i]
+        ax.set_title(country_name, fontsize=8, weight='bold')
+
+        if annot_threshold is not None:
+            rows, cols = np.nonzero(np.abs(corr_stack[i]) >= annot_threshold)
+            for row, col in zip(rows, cols):
+                if row == col:
+                    continue
+                value = corr_stack[i][row, col]
+                ax.text(
+                    col, row, f"{value:.1f}",
+                    ha='center', va='center', fontsize=4,
+                    color=high_contrast_color(cmap(norm(value)))
+                )
+
+        # Only the outer panels carry the feature names. Tick objects are the
+        # most expensive part of the figure, so inner panels get none at all
+        if i + ncols >= n_panels:
+            ax.set_xticks(ticks, tick_labels, rotation=90, fontsize=4)
+        else:
+            ax.set_xticks([])
+        if i % ncols == 0:
+            ax.set_yticks(ticks, tick_labels, fontsize=4)
+        else:
+            ax.set_yticks([])
+        ax.tick_params(length=0)
+        for spine in ax.spines.values():
+            spine.set_visible(False)
+
+    fig.colorbar(image, ax=axes.ravel().tolist(), shrink=0.6, label='Correlation Coefficient')
+    fig.suptitle('Correlation Matrix of Numeric Spotify Song Features by Country', fontsize=14, weight='bold')
+
+    plt.savefig(f"{save_path}.png", dpi=dpi, bbox_inches='tight')
+    plt.show()
+
 def get_monthly_correlation_query() -> str:
     """
     Constructs a PostgreSQL query to calculate the monthly correlation
     between two specified columns.
 
     Returns:
-        str: The SQL query string.
+        str: The SQL query string, with `{feature_col}` and `{target_col}`
+            placeholders, an optional `{date_filter}` of extra conditions
+            (left empty by `get_monthly_correlations`) and the country as
+            query parameter.
     """
     return"""
     WITH by_month AS (
@@ -226,6 +455,7 @@ def get_monthly_correlation_query() -> str:
             AND danceability IS NOT NULL
             AND popularity IS NOT NULL
             AND country = %s
+            {date_filter}
     )
     SELECT
         month,
@@ -240,6 +470,440 @@ def get_monthly_correlation_query() -> str:
         month;
     """
 
+def get_monthly_values_query() -> str:
+    """
+    Constructs a PostgreSQL query returning the raw values of two specified
+    columns, with their month, for one country.
+
+    Rank correlations cannot be aggregated by the database like CORR(), so
+    they are computed from these rows (see `get_monthly_correlations`). The
+    `{source}` placeholder is the table or a sample of it (see `get_sample_source`).
+
+    Returns:
+        str: The SQL query string.
+    """
+    return"""
+    SELECT
+        EXTRACT(MONTH FROM snapshot_date) AS month,
+        TO_CHAR(snapshot_date, 'Mon') AS month_name,
+        {feature_col} AS feature_col,
+        {target_col} AS target_col
+    FROM
+        {source}
+    WHERE
+        snapshot_date IS NOT NULL
+        AND {feature_col} IS NOT NULL
+        AND {target_col} IS NOT NULL
+        AND country = %s
+    ORDER BY
+        month;
+    """
+
+def get_sampled_monthly_correlation_query() -> str:
+    """
+    Constructs a PostgreSQL query to calculate the monthly correlation
+    between two specified columns over a sample of the rows, together with
+    the number of rows behind each month, from which the confidence interval
+    is derived. The `{source}` placeholder is filled by `get_sample_source`.
+
+    Returns:
+        str: The SQL query string.
+    """
+    return"""
+    SELECT
+        EXTRACT(MONTH FROM snapshot_date) AS month,
+        TO_CHAR(snapshot_date, 'Mon') AS month_name,
+        CORR({feature_col}, {target_col}) AS correlation,
+        COUNT(*) AS n
+    FROM
+        {source}
+    WHERE
+        snapshot_date IS NOT NULL
+        AND {feature_col} IS NOT NULL
+        AND {target_col} IS NOT NULL
+        AND country = %s
+    GROUP BY
+        month,
+        month_name
+    ORDER BY
+        month;
+    """
+
+def get_sampled_heat_map_query() -> str:
+    """
+    Constructs a PostgreSQL query to select all columns of a sample of the
+    'spotify_songs_2024' table. The `{source}` placeholder is filled by
+    `get_sample_source` and `{where}` by the optional row filters.
+
+    Returns:
+        str: The SQL query string.
+    """
+    return """
+    SELECT *
+    FROM
+        {source}
+    {where}
+    """
+
+def get_table_sample_query() -> str:
+    """
+    Constructs a PostgreSQL query returning a repeatable random sample of
+    the 'spotify_songs_2024' table with TABLESAMPLE.
+
+    BERNOULLI keeps each row with the given probability. SYSTEM keeps whole
+    storage blocks, which is faster but clusters the sample.
+
+    Returns:
+        str: The SQL query string, with `{sampling_method}`, `{sample_percent}`
+            and `{seed}` placeholders.
+    """
+    return """
+    SELECT *
+    FROM
+        spotify_songs_2024 TABLESAMPLE {sampling_method} ({sample_percent}) REPEATABLE ({seed})
+    """
+
+def get_stratified_sample_query() -> str:
+    """
+    Constructs a PostgreSQL query returning a repeatable sample of every
+    (country, month) of the 'spotify_songs_2024' table.
+
+    Each stratum keeps the larger of `{rows_per_stratum}` rows and
+    `{fraction}` of its rows (or all of them if it is smaller), so small
+    countries and months are never left without data. Rows are picked in the
+    order of a hash of their key and the `{seed}`, so the same seed always
+    returns the same rows. The strata only hold the rows kept by `{where}`.
+
+    Returns:
+        str: The SQL query string.
+    """
+    return """
+    SELECT *
+    FROM (
+        SELECT
+            *,
+            COUNT(*) OVER (
+                PARTITION BY country, EXTRACT(MONTH FROM snapshot_date)
+            ) AS stratum_rows,
+            ROW_NUMBER() OVER (
+                PARTITION BY country, EXTRACT(MONTH FROM snapshot_date)
+                ORDER BY MD5(spotify_id || country || CAST(snapshot_date AS TEXT) || {seed})
+            ) AS stratum_row
+        FROM
+            spotify_songs_2024
+        {where}
+    ) AS strata
+    WHERE
+        stratum_row <= GREATEST({rows_per_stratum}, CEIL({fraction} * stratum_rows))
+    """
+
+def get_sample_population_query() -> str:
+    """
+    Constructs a PostgreSQL query counting the rows of every (country, month)
+    kept by `{where}`, used to turn a target error into a sampling fraction.
+
+    Returns:
+        str: The SQL query string.
+    """
+    return """
+    SELECT
+        country,
+        EXTRACT(MONTH FROM snapshot_date) AS month,
+        COUNT(*) AS n_rows
+    FROM
+        spotify_songs_2024
+    {where}
+    GROUP BY
+        country,
+        month;
+    """
+
+def get_sample_source(
+        db_client: DatabaseClient,
+        sampling: Optional[Dict[str, any]] = None,
+        countries: Optional[List[str]] = None,
+        by_month: bool = False,
+        method: str = 'pearson',
+        where: Optional[sql.Composable] = None
+        ) -> sql.Composable:
+    """
+    Builds the FROM clause of a sampled query.
+
+    With a 'fraction', every row has that probability of being kept. With a
+    'target_error', the sample size needed for that interval half-width is
+    derived from Fisher's z (see `src.sampling`) for every cell of the
+    analysis: each country, or each month of each country if `by_month`.
+    TABLESAMPLE then uses the fraction required by the smallest of those
+    cells, while stratified sampling takes the rows from every stratum.
+    Cells are counted after the row filters of the analysis (`where`), so
+    filtering the sample does not leave fewer rows than required.
+
+    Args:
+        db_client (DatabaseClient): An instance of the DatabaseClient to fetch data.
+        sampling (Optional[Dict[str, any]]): Sampling request (see
+            `src.sampling.resolve_sampling`). `None` uses the whole table.
+        countries (Optional[List[str]]): Countries analysed, to size the
+            sample for them. Defaults to all of them.
+        by_month (bool): Whether the correlations are computed per month.
+            Defaults to False.
+        method (str): Correlation method, which sets the sample size.
+            Defaults to 'pearson'.
+        where (Optional[sql.Composable]): WHERE clause of the row filters
+            applied to the sample. Defaults to no filter.
+
+    Returns:
+        sql.Composable: The table or the sample subquery, aliased 'sampled'.
+    """
+    sampling = resolve_sampling(sampling)
+    if sampling is None:
+        return sql.Identifier('spotify_songs_2024')
+
+    where = where if where is not None else sql.SQL('')
+    fraction = sampling['fraction']
+    rows_per_stratum = 0
+    if sampling['target_error'] is not None:
+        required_rows = required_sample_size(sampling['target_error'], sampling['confidence'], method)
+        fraction = 0
+        if sampling['method'] == 'stratified':
+            # A country cell is spread over its 12 monthly strata
+            rows_per_stratum = required_rows if by_month else math.ceil(required_rows / 12)
+        else:
+            df_population = db_client.get_data(sql.SQL(get_sample_population_query()).format(where=where))
+            if countries:
+                df_population = df_population[df_population['country'].isin(countries)]
+            cell_cols = ['country', 'month'] if by_month else ['country']
+            cell_rows = df_population.groupby(cell_cols)['n_rows'].sum()
+            fraction = sample_fraction(required_rows, int(cell_rows.min()) if len(cell_rows) else 0)
+        print(f"Target error ±{sampling['target_error']} requires {required_rows} rows per cell.")
+
+    if sampling['method'] == 'stratified':
+        sample_query = sql.SQL(get_stratified_sample_query()).format(
+            seed=sql.Literal(str(sampling['seed'])),
+            rows_per_stratum=sql.Literal(rows_per_stratum),
+            fraction=sql.Literal(float(fraction)),
+            where=where
+        )
+    else:
+        sample_query = sql.SQL(get_table_sample_query()).format(
+            sampling_method=sql.SQL(sampling['method'].upper()),
+            # Fixed-point, tiny fractions would otherwise render as e.g. 1e-05
+            sample_percent=sql.SQL(f"{100 * fraction:.6f}"),
+            seed=sql.Literal(int(sampling['seed']))
+        )
+        print(f"Sampling {100 * fraction:.2f}% of the rows with {sampling['method'].upper()}.")
+
+    return sql.SQL("({sample_query}) AS sampled").format(sample_query=sample_query)
+
+def get_monthly_correlations(
+    db_client: DatabaseClient,
+    query: str,
+    target_country_value: str,
+    feature_to_correlate: str,
+    target_col: str = 'popularity',
+    method: str = 'pearson',
+    sampling: Optional[Dict[str, any]] = None,
+    sample_source: Optional[sql.Composable] = None
+) -> pd.DataFrame:
+    """
+    Fetches the monthly correlation between a feature and the target column
+    for one country.
+
+    Args:
+        db_client (DatabaseClient): An instance of the DatabaseClient to fetch data.
+        query (str): The query returned by `get_monthly_correlation_query`.
+            It is only used for exact 'pearson', which the database computes
+            with CORR(); the rank methods fetch the raw values with
+            `get_monthly_values_query` and the approximate mode uses
+            `get_sampled_monthly_correlation_query` instead.
+        target_country_value (str): ISO 3166-1 alpha-2 country code ('ZZ' for Global).
+        feature_to_correlate (str): Column correlated against `target_col`.
+        target_col (str): Target column. Defaults to 'popularity'.
+        method (str): One of 'pearson', 'spearman' or 'kendall'. Defaults to 'pearson'.
+        sampling (Optional[Dict[str, any]]): Approximate mode (see
+            src/sampling.py). If `None`, the exact correlations are computed.
+            Defaults to `None`.
+        sample_source (Optional[sql.Composable]): FROM clause returned by
+            `get_sample_source` for `sampling`, to reuse it across calls.
+            Built from `sampling` when `None`.
+
+    Returns:
+        pd.DataFrame: One row per month with 'month', 'month_name' and
+            'correlation' columns. In approximate mode, also 'n' (sampled
+            rows) and the 'ci_low' and 'ci_high' bounds of the confidence
+            interval.
+
+    Raises:
+        ValueError: If `method` is not supported.
+    """
+    if method not in CORRELATION_METHODS:
+        raise ValueError(f"Unsupported correlation method '{method}'. Use one of {CORRELATION_METHODS}.")
+
+    sampling = resolve_sampling(sampling)
+    if sampling is not None and sample_source is None:
+        sample_source = get_sample_source(
+            db_client, sampling, countries=[target_country_value], by_month=True, method=method
+        )
+    source = sample_source if sampling is not None else sql.Identifier('spotify_songs_2024')
+
+    if method != 'pearson':
+        query = get_monthly_values_query()
+    elif sampling is not None:
+        query = get_sampled_monthly_correlation_query()
+
+    composed_query = sql.SQL(query).format(
+        feature_col=sql.Identifier(feature_to_correlate),
+        target_col=sql.Identifier(target_col),
+        source=source,
+        date_filter=sql.SQL('')
+    )
+
+    df = db_client.get_data(composed_query,(target_country_value,))
+    if df.empty:
+        return df.copy()
+
+    if method == 'pearson':
+        monthly_correlations = df.copy()
+    else:
+        monthly_correlations = pd.DataFrame([
+            {
+                'month': month,
+                'month_name': month_name,
+                'correlation': pairwise_correlation(
+                    month_df['feature_col'].to_numpy(dtype=float),
+                    month_df['target_col'].to_numpy(dtype=float),
+                    method
+                ),
+                'n': len(month_df)
+            }
+            for (month, month_name), month_df in df.groupby(['month', 'month_name'], sort=False)
+        ])
+        if sampling is None:
+            monthly_correlations = monthly_correlations.drop(columns='n')
+
+    if sampling is not None:
+        monthly_correlations['ci_low'], monthly_correlations['ci_high'] = confidence_interval(
+            monthly_correlations['correlation'].to_numpy(dtype=float),
+            monthly_correlations['n'].to_numpy(dtype=float),
+            sampling['confidence'],
+            method
+        )
+    return monthly_correlations
+
+def fetch_arrays(
+        db_client: DatabaseClient,
+        query: sql.Composable,
+        columns: List[str],
+        params: Optional[tuple] = None
+        ) -> Dict[str, np.ndarray]:
+    """
+    Executes a query and returns the requested columns as NumPy arrays.
+
+    Clients with a `get_arrow` method (`DuckDBClient`) hand the result over
+    as an Arrow table, and only the requested columns are converted, without
+    building a DataFrame of the whole result. Other clients go through
+    `get_data`.
+
+    Args:
+        db_client (DatabaseClient): An instance of a database client object.
+        query (sql.Composable): The SQL query to execute.
+        columns (List[str]): Columns of the result to return. Numeric
+            columns are returned as float64 with NaN for missing values, the
+            others as object arrays.
+        params (Optional[tuple]): Parameters of the query. Defaults to None.
+
+    Returns:
+        Dict[str, np.ndarray]: One array per requested column.
+    """
+    if hasattr(db_client, 'get_arrow'):
+        table = db_client.get_arrow(query, params)
+        arrays = {col: table.column(col).to_numpy() for col in columns}
+    else:
+        df = db_client.get_data(query, params)
+        arrays = {
+            col: df[col].to_numpy(dtype=np.float64) if pd.api.types.is_numeric_dtype(df[col]) else df[col].to_numpy()
+            for col in columns
+        }
+
+    # Arrow already turns integer columns with nulls into float64 with NaN
+    return {
+        col: values.astype(np.float64, copy=False) if values.dtype.kind in 'biuf' else values
+        for col, values in arrays.items()
+    }
+
+def sweep_feature_correlations(
+        db_client: DatabaseClient,
+        features: List[str],
+        target_col: str = 'popularity',
+        countries: Optional[List[str]] = None,
+        method: str = 'pearson',
+        sampling: Optional[Dict[str, any]] = None
+        ) -> pd.DataFrame:
+    """
+    Correlates every feature with the target column in every country, from
+    a single (optionally sampled) query.
+
+    Meant for exploration: sweep all the combinations in approximate mode,
+    then rerun the interesting cells exactly with `sampling=None` and only
+    those countries and features.
+
+    Args:
+        db_client (DatabaseClient): An instance of the DatabaseClient to fetch data.
+        features (List[str]): Columns correlated against `target_col`.
+        target_col (str): Target column. Defaults to 'popularity'.
+        countries (Optional[List[str]]): ISO 3166-1 alpha-2 country codes
+            ('ZZ' for Global). Defaults to all of them.
+        method (str): One of 'pearson', 'spearman' or 'kendall'. Defaults to 'pearson'.
+        sampling (Optional[Dict[str, any]]): Approximate mode (see
+            src/sampling.py). If `None`, the exact correlations are computed.
+            Defaults to `None`.
+
+    Returns:
+        pd.DataFrame: One row per (country, feature) with 'correlation' and
+            'n', plus 'ci_low' and 'ci_high' in approximate mode, sorted by
+            decreasing absolute correlation.
+    """
+    features = [feature for feature in features if feature != target_col]
+    where = sql.SQL('')
+    if countries:
+        where = sql.SQL("WHERE country IN ({countries})").format(
+            countries=sql.SQL(', ').join(sql.Literal(country) for country in countries)
+        )
+    query = sql.SQL(get_sampled_heat_map_query()).format(
+        source=get_sample_source(db_client, sampling, countries=countries, method=method, where=where),
+        where=where
+    )
+    data = fetch_arrays(db_client, query, columns=['country', target_col] + features)
+
+    # Rows of each country, found with one sort instead of a pandas groupby
+    country_codes = data['country'].astype(str)
+    order = np.argsort(country_codes, kind='stable')
+    country_names, starts = np.unique(country_codes[order], return_index=True)
+
+    results = []
+    for country, rows in zip(country_names, np.split(order, starts[1:])):
+        target = data[target_col][rows]
+        for feature in features:
+            values = data[feature][rows]
+            results.append({
+                'country': country,
+                'feature': feature,
+                'correlation': pairwise_correlation(values, target, method),
+                'n': int((~(np.isnan(values) | np.isnan(target))).sum())
+            })
+
+    df_sweep = pd.DataFrame(results, columns=['country', 'feature', 'correlation', 'n'])
+    sampling = resolve_sampling(sampling)
+    if sampling is not None:
+        df_sweep['ci_low'], df_sweep['ci_high'] = confidence_interval(
+            df_sweep['correlation'].to_numpy(dtype=float),
+            df_sweep['n'].to_numpy(dtype=float),
+            sampling['confidence'],
+            method
+        )
+
+    print(f"Correlations calculated for {df_sweep['country'].nunique()} countries x {len(features)} features.")
+    return df_sweep.sort_values('correlation', key=abs, ascending=False, ignore_index=True)
+
 def plot_monthly_correlations(
     db_client: DatabaseClient,
     query: str,
@@ -250,9 +914,15 @@ def plot_monthly_correlations(
     show_min: bool = True,
     show_max: bool = True,  
     text_separation: float = 0.05,
-    save_path: str = 'output/monthly_correlations.png'      
+    save_path: str = 'output/monthly_correlations.png',
+    method: str = 'pearson',
+    stats: Optional[StreamingStats] = None,
+    sampling: Optional[Dict[str, any]] = None
 ) -> None:
-    
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import pycountry
+
     plt.figure(figsize=(12, 7))
     plot_any = False #in case the correlation thresholg is too high and any figure is drawn
     color_idx = 0 # Initialize color index for line colors
@@ -355,20 +1025,28 @@ def plot_monthly_correlations(
     # to generate the correlation plots.
 
     for target_country_value in target_country_values:
-        
+
+        # Approximate mode: one sample per country, shared by all its features
+        sample_source = None
+        if sampling is not None and stats is None:
+            sample_source = get_sample_source(
+                db_client, sampling, countries=[target_country_value], by_month=True, method=method
+            )
+
         for feature_to_correlate in features_to_correlate:
 
             
             current_line_color = colors[color_idx % len(colors)] #% don't allow to select an indice bigger than 19, 20%20 =0, 
            
 
-            composed_query = sql.SQL(query).format(
-                feature_col=sql.Identifier(feature_to_correlate),
-                target_col=sql.Identifier(target_col)
-            )
-
-            df = db_client.get_data(composed_query,(target_country_value,))
-            monthly_correlations = df.copy()
+            if stats is not None:
+                # Precomputed from the raw CSV (src/streaming.py), Pearson only
+                monthly_correlations = stats.monthly_correlations(target_country_value, feature_to_correlate, target_col)
+            else:
+                monthly_correlations = get_monthly_correlations(
+                    db_client, query, target_country_value, feature_to_correlate, target_col, method,
+                    sampling=sampling, sample_source=sample_source
+                )
             
             if (abs(monthly_correlations['correlation']) >= correlation_threshold).any():
 
@@ -383,6 +1061,17 @@ def plot_monthly_correlations(
                     linewidth=2,
                     label=f"{feature_to_correlate.replace('_', ' ').title()} vs {target_col.title()}-{pycountry.countries.get(alpha_2=target_country_value).name if pycountry.countries.get(alpha_2=target_country_value) else "Global" }"  
                     )
+
+                if 'ci_low' in monthly_correlations.columns:
+                    # Confidence interval of the approximate correlations
+                    plt.fill_between(
+                        monthly_correlations['month_name'],
+                        monthly_correlations['ci_low'],
+                        monthly_correlations['ci_high'],
+                        color=current_line_color,
+                        alpha=0.15,
+                        linewidth=0
+                    )
                 
                 if show_min:
                     # Calculate absolute correlations ( returna pandas series)
@@ -450,7 +1139,10 @@ def plot_monthly_correlations(
         ax.spines['bottom'].set_visible(False) # Remove x-axis line
         ax.spines['left'].set_visible(False) 
             
-        plt.legend(title='Correlation', bbox_to_anchor=(1.02, 1), loc='upper left', ncol=1, borderaxespad=0.)
+        legend_title = 'Correlation' if method == 'pearson' else f'Correlation ({method.title()})'
+        if sampling is not None and stats is None:
+            legend_title += f"\napproximate, {resolve_sampling(sampling)['confidence']:.0%} CI shaded"
+        plt.legend(title=legend_title, bbox_to_anchor=(1.02, 1), loc='upper left', ncol=1, borderaxespad=0.)
         plt.tight_layout()
         plt.savefig(f"{save_path}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.png", dpi=300, bbox_inches='tight') # Adjust layout to prevent labels/legend from overlapping
         plt.show() #
@@ -506,7 +1198,8 @@ def get_explicit_popularity_query() -> str:
 def plot_explicit_popularity_map(
         db_client: DatabaseClient,
         explicit_popularity_query: str,
-        save_path: str = 'output/world_map_average_popularity.png' 
+        save_path: str = 'output/world_map_average_popularity.png',
+        df_explicit_popularity: Optional[pd.DataFrame] = None
         ) -> None:
     """
     Fetches explicit song popularity data from the database and plots it on a world map.
@@ -519,14 +1212,28 @@ def plot_explicit_popularity_map(
         db_client (DatabaseClient): An instance of the DatabaseClient to fetch data.
         explicit_popularity_query (str): The SQL query string to fetch explicit song popularity data.
         save_path (str): The file path to save the generated map image. Defaults to 'output/world_map_average_popularity.png'.
+        df_explicit_popularity (Optional[pd.DataFrame]): Already computed
+            'country' and 'avg_explicit_popularity' columns (e.g. from
+            `StreamingStats.explicit_popularity`). If given, the database is
+            not queried. Defaults to `None`.
     """
+    import matplotlib.cm as cm
+    import matplotlib.pyplot as plt
+    import pycountry
+    import cartopy.crs as ccrs
+    import cartopy.feature as cfeature
+    import cartopy.io.shapereader as shpreader
+    from src.utils import high_contrast_color
 
     # 2. Use the get_data_from_db function to fetch the data into a Pandas DataFrame
-    try:
-        df_explicit_popularity = db_client.get_data(explicit_popularity_query)
-    except Exception as e:
-        print(f"ERROR: Could not fetch data for explicit song popularity by country. Details: {e}")
-        df_explicit_popularity = pd.DataFrame() # Ensure an empty DataFrame if an error occurs
+    if df_explicit_popularity is None:
+        try:
+            df_explicit_popularity = db_client.get_data(explicit_popularity_query)
+        except Exception as e:
+            print(f"ERROR: Could not fetch data for explicit song popularity by country. Details: {e}")
+            df_explicit_popularity = pd.DataFrame() # Ensure an empty DataFrame if an error occurs
+    else:
+        df_explicit_popularity = df_explicit_popularity.copy()
 
     # 3. Data preparation: Prepare data for mapping
     if not df_explicit_popularity.empty:
@@ -652,13 +1359,228 @@ def plot_explicit_popularity_map(
         plt.savefig(save_path, format='png', bbox_inches='tight', dpi=300)
         plt.show()
 
-def main() -> None:
+def get_first_appearance_query() -> str:
     """
-    Main function to execute the script for generating plots.
-    Initializes the database client and calls the plotting functions.
+    Constructs a PostgreSQL query returning the first chart appearance of
+    every song in every country.
+
+    The aggregation is done by the database so only one row per
+    (spotify_id, country) pair is transferred, instead of every daily entry.
+
+    Returns:
+        str: The SQL query string.
+    """
+    return """
+    SELECT
+        spotify_id,
+        country,
+        MIN(snapshot_date) AS first_date
+    FROM
+        spotify_songs_2024
+    WHERE
+        snapshot_date IS NOT NULL
+    GROUP BY
+        spotify_id,
+        country;
+    """
+
+def plot_diffusion_matrices(
+        db_client: DatabaseClient,
+        first_appearance_query: str,
+        min_shared: int = 5,
+        save_path: str = 'output/diffusion'
+        ) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
+    Computes and plots how hits spread between countries.
+
+    The first appearance of each song per country is fetched and reduced to a
+    (track x country) matrix, from which the median debut lag and the number
+    of shared songs are computed for every pair of countries (see
+    `src.diffusion`). Both matrices are rendered with `plot_heat_map`.
+
+    Args:
+        db_client (DatabaseClient): An instance of the DatabaseClient to fetch data.
+        first_appearance_query (str): The SQL query string returning
+            'spotify_id', 'country' and 'first_date' columns.
+        min_shared (int): Minimum number of shared songs required to report a
+            lag between two countries. Defaults to 5.
+        save_path (str): Prefix of the saved PNG files. Defaults to 'output/diffusion'.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: The lag matrix (median days from the
+            row country to the column country) and the co-occurrence matrix.
+    """
+    df_first_appearance = db_client.get_data(first_appearance_query)
+
+    if df_first_appearance.empty:
+        print("Warning: No first appearance data fetched. Skipping diffusion plots.")
+        return pd.DataFrame(), pd.DataFrame()
+
+    first_appearance, track_ids, countries = build_first_appearance_matrix(df_first_appearance)
+    print(f"First appearance matrix built: {len(track_ids)} songs x {len(countries)} countries.")
+
+    lag_matrix, co_occurrence_matrix = compute_diffusion_matrices(
+        first_appearance, countries, min_shared=min_shared
+    )
+
+    plot_heat_map(
+        lag_matrix,
+        row_filters={"min_shared_songs": min_shared},
+        save_path=f"{save_path}_lag",
+        title='Median Debut Lag Between Countries (days, row -> column)',
+        cbar_label='Median Lag (days)',
+        fmt='.0f',
+        annot=False
+    )
+    plot_heat_map(
+        co_occurrence_matrix,
+        row_filters={"min_shared_songs": min_shared},
+        save_path=f"{save_path}_co_occurrence",
+        title='Songs Charting in Both Countries',
+        cbar_label='Shared Songs',
+        fmt='d',
+        annot=False
+    )
+
+    return lag_matrix, co_occurrence_matrix
+
+def get_track_features_query() -> str:
+    """
+    Constructs a PostgreSQL query returning one row of audio features per song.
+
+    Audio features are repeated on every daily chart entry, so the database
+    collapses them to one row per 'spotify_id' before they are transferred.
+    The `{feature_values}` placeholder is filled by `find_similar_tracks`
+    with one `MIN(feature) AS feature` per feature. The values of a song are
+    identical after sql/03, and unlike AVG(), MIN() returns one of them
+    exactly, so the index fingerprint does not depend on the summation order.
+
+    Returns:
+        str: The SQL query string.
+    """
+    return """
+    SELECT
+        spotify_id,
+        {feature_values}
+    FROM
+        spotify_songs_2024
+    GROUP BY
+        spotify_id;
+    """
+
+def get_track_stats_query() -> str:
+    """
+    Constructs a PostgreSQL query returning the chart performance of a set of
+    songs in every country.
+
+    The `{track_placeholders}` placeholder is filled by `find_similar_tracks`
+    with one parameter per requested 'spotify_id'.
+
+    Returns:
+        str: The SQL query string.
+    """
+    return """
+    SELECT
+        spotify_id,
+        MIN(name) AS name,
+        MIN(artists) AS artists,
+        country,
+        COUNT(*) AS days_on_chart,
+        ROUND(AVG(popularity), 2) AS avg_popularity,
+        MAX(popularity) AS max_popularity,
+        MIN(daily_rank) AS best_rank,
+        ROUND(AVG(daily_rank), 2) AS avg_rank
+    FROM
+        spotify_songs_2024
+    WHERE
+        spotify_id IN ({track_placeholders})
+    GROUP BY
+        spotify_id,
+        country
+    ORDER BY
+        spotify_id,
+        country;
+    """
+
+def find_similar_tracks(
+        db_client: DatabaseClient,
+        track_ids: List[str],
+        k: int = 10,
+        feature_cols: Optional[List[str]] = None,
+        countries: Optional[List[str]] = None,
+        index_dir: str = 'output/similarity_index'
+        ) -> pd.DataFrame:
+    """
+    Finds the songs that sound most like the given ones and how they charted.
+
+    The per-song features are indexed once with a KD-tree persisted in
+    `index_dir` (see `src.similarity`), which is only rebuilt when the songs
+    change. All the requested songs are searched in a single batch and the
+    chart statistics of their neighbours are fetched with one query.
+
+    Args:
+        db_client (DatabaseClient): An instance of the DatabaseClient to fetch data.
+        track_ids (List[str]): 'spotify_id' of the reference songs.
+        k (int): Number of similar songs per reference song. Defaults to 10.
+        feature_cols (Optional[List[str]]): Audio features defining the
+            similarity. Defaults to danceability, energy, valence, tempo and loudness.
+        countries (Optional[List[str]]): Only report the statistics of these
+            ISO 3166-1 alpha-2 country codes ('ZZ' for Global). Defaults to all.
+        index_dir (str): Directory of the persisted index. Defaults to
+            'output/similarity_index'.
+
+    Returns:
+        pd.DataFrame: One row per (reference song, neighbour, country) with the
+            neighbour rank, its distance in standard deviations and its
+            days on chart, popularity and rank statistics.
+    """
+    from src.similarity import SIMILARITY_FEATURES, SimilarityIndex, join_neighbor_stats
+
+    feature_cols = feature_cols or SIMILARITY_FEATURES
+    features_query = sql.SQL(get_track_features_query()).format(
+        feature_values=sql.SQL(', ').join(
+            sql.SQL("MIN({col}) AS {col}").format(col=sql.Identifier(col)) for col in feature_cols
+        )
+    )
+    df_features = db_client.get_data(features_query)
+    index = SimilarityIndex.load_or_build(df_features, index_dir, feature_cols)
+
+    neighbors = index.similar_tracks(track_ids, k=k)
+    if neighbors.empty:
+        print("Warning: No similar tracks found.")
+        return neighbors
+
+    neighbor_ids = neighbors['spotify_id'].unique().tolist()
+    stats_query = sql.SQL(get_track_stats_query()).format(
+        track_placeholders=sql.SQL(', ').join(sql.Placeholder() * len(neighbor_ids))
+    )
+    df_stats = db_client.get_data(stats_query, neighbor_ids)
+    if countries:
+        df_stats = df_stats[df_stats['country'].isin(countries)]
+
+    return join_neighbor_stats(neighbors, df_stats)
+
+def get_db_client():
+    """
+    Creates the client used to query the cleaned data.
+
+    The embedded DuckDB backend is used when the `SPOTIFY_PARQUET_PATH`
+    environment variable points to a Parquet export of the cleaned table
+    (see src/duckdb_client.py). Otherwise a PostgreSQL client is created with
+    the credentials from config.
+
+    Returns:
+        DatabaseClient or DuckDBClient: A client exposing `get_data`.
+    """
+    parquet_path = os.environ.get('SPOTIFY_PARQUET_PATH')
+    if parquet_path:
+        from src.duckdb_client import DuckDBClient
+        return DuckDBClient(parquet_path)
+
+    from config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+
     # Initialize the database client with credentials from config
-    db_client = DatabaseClient(
+    return DatabaseClient(
         host=DB_HOST,
         port=DB_PORT,
         dbname=DB_NAME,
@@ -666,6 +1588,20 @@ def main() -> None:
         password=DB_PASSWORD
     )
 
+def main() -> None:
+    """
+    Main function to execute the script for generating plots.
+    Initializes the database client and calls the plotting functions.
+    """
+    # Without a database, stream the raw Kaggle CSV once (see src/streaming.py)
+    csv_path = os.environ.get('SPOTIFY_CSV_PATH')
+    if csv_path:
+        stats = stream_csv_statistics(csv_path)
+        db_client = None
+    else:
+        stats = None
+        db_client = get_db_client()
+
     """    # List of non-numeric columns (excluded from correlation analysis)
     no_num_col = [
         "id", "spotify_id", "name", "artists", "daily_movement", "weekly_movement",
@@ -673,11 +1609,7 @@ def main() -> None:
     ]
     """
     # List of numeric columns (eligible for correlation analysis)
-    num_cols = [
-        "daily_rank", "popularity", "is_explicit", "duration_ms", "danceability",
-        "energy", "key", "loudness", "mode", "speechiness", "acousticness",
-        "instrumentalness", "liveness", "valence", "tempo", "time_signature"
-    ]
+    num_cols = NUMERIC_COLS
 
     # Columns to include in the correlation matrix
     col_2_corr = [
@@ -708,13 +1640,16 @@ def main() -> None:
     target_country_values = ['US']
 
     # Generate and plot the correlation matrix heatmap
-    df_filtered = df_to_corr_matrix(
-        db_client=db_client,
-        query=get_heat_map_query(),
-        row_filters=row_filters,
-        col_2_corr=col_2_corr,
-        numeric_cols=num_cols
-    )
+    if stats is not None:
+        df_filtered = stats.corr_matrix(country=row_filters.get("country"), columns=col_2_corr)
+    else:
+        df_filtered = df_to_corr_matrix(
+            db_client=db_client,
+            query=get_heat_map_query(),
+            row_filters=row_filters,
+            col_2_corr=col_2_corr,
+            numeric_cols=num_cols
+        )
 
     plot_heat_map(
         df_filtered,
@@ -732,13 +1667,15 @@ def main() -> None:
         show_min=True,
         show_max=True,
         text_separation=0.05,
-        save_path='output/monthly_correlations'
+        save_path='output/monthly_correlations',
+        stats=stats
     )
 
     # Plot world map of average explicit song popularity by country
     plot_explicit_popularity_map(
         db_client=db_client,
-        explicit_popularity_query=get_explicit_popularity_query()
+        explicit_popularity_query=get_explicit_popularity_query(),
+        df_explicit_popularity=stats.explicit_popularity() if stats is not None else None
     )
 
 
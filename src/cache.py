@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    A thread-safe in-memory cache with least-recently-used eviction and a
+    time-to-live for every entry.
+
+    Entries are tagged with the data watermark they were computed from. When
+    the watermark of the underlying table changes, `invalidate_if_stale`
+    drops every entry so no result computed from old data is served.
+    """
+
+    def __init__(self, max_entries=128, ttl_seconds=600):
+        """
+        Initializes the ResponseCache.
+
+        Args:
+            max_entries (int): Maximum number of cached responses. The least
+                               recently used entry is evicted beyond it.
+                               Defaults to 128.
+            ttl_seconds (float): Lifetime of an entry in seconds. Defaults to 600.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.watermark = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the cached value for `key`, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key) # Mark as most recently used
+            return value
+
+    def set(self, key, value):
+        """
+        Stores `value` under `key`, evicting the least recently used entries
+        if the cache is full.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_if_stale(self, watermark):
+        """
+        Clears the cache if `watermark` differs from the one the cached
+        entries were computed from.
+
+        Args:
+            watermark (str): Current watermark of the underlying data.
+
+        Returns:
+            bool: True if the cache was cleared.
+        """
+        with self._lock:
+            if watermark == self.watermark:
+                return False
+
+            self._entries.clear()
+            self.watermark = watermark
+            return True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,13 @@
+# Shared by the SQL, DuckDB and streaming paths and by the command line, which
+# imports this module without loading pandas, so it must not import anything.
+
+# Numeric columns of the cleaned table (eligible for correlation analysis)
+NUMERIC_COLS = [
+    "daily_rank", "popularity", "is_explicit", "duration_ms", "danceability",
+    "energy", "key", "loudness", "mode", "speechiness", "acousticness",
+    "instrumentalness", "liveness", "valence", "tempo", "time_signature"
+]
+
+CORRELATION_METHODS = ('pearson', 'spearman', 'kendall')
+
+SAMPLING_METHODS = ('bernoulli', 'system', 'stratified')
@@ -0,0 +1,180 @@
+import warnings
+from typing import List, Union
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from src.constants import CORRELATION_METHODS
+
+
+def rank_columns(values: np.ndarray) -> np.ndarray:
+    """
+    Ranks every column of a 2-D array in one vectorized pass.
+
+    Ties receive the average of the ranks they span (as `pd.DataFrame.rank`
+    does by default). Ranks start at 1.
+
+    Args:
+        values (np.ndarray): Array of shape (n_rows, n_columns) without NaNs.
+
+    Returns:
+        np.ndarray: Float array of the same shape holding the ranks.
+    """
+    n_rows = values.shape[0]
+    order = np.argsort(values, axis=0, kind='stable')
+    sorted_values = np.take_along_axis(values, order, axis=0)
+
+    # Mark the first and last position of every run of equal values
+    is_start = np.ones(values.shape, dtype=bool)
+    is_start[1:] = sorted_values[1:] != sorted_values[:-1]
+    is_end = np.ones(values.shape, dtype=bool)
+    is_end[:-1] = is_start[1:]
+
+    positions = np.broadcast_to(np.arange(1, n_rows + 1)[:, None], values.shape)
+    run_start = np.maximum.accumulate(np.where(is_start, positions, 0), axis=0)
+    run_end = np.minimum.accumulate(np.where(is_end, positions, n_rows + 1)[::-1], axis=0)[::-1]
+
+    ranks = np.empty(values.shape, dtype=np.float64)
+    np.put_along_axis(ranks, order, (run_start + run_end) / 2, axis=0)
+    return ranks
+
+
+def kendall_tau_b(x: np.ndarray, y: np.ndarray) -> float:
+    """
+    Computes Kendall's tau-b between two 1-D arrays with
+    `scipy.stats.kendalltau`, which is O(n log n) (Knight's algorithm).
+    Rows where either value is NaN are ignored.
+
+    Args:
+        x (np.ndarray): First variable.
+        y (np.ndarray): Second variable.
+
+    Returns:
+        float: Tau-b, or NaN if fewer than two rows remain or a variable is constant.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    mask = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[mask], y[mask]
+    if len(x) < 2:
+        return np.nan
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)  # Constant variables give NaN
+        return float(stats.kendalltau(x, y, variant='b').statistic)
+
+
+def pairwise_correlation(x: np.ndarray, y: np.ndarray, method: str = 'pearson') -> float:
+    """
+    Correlation between two 1-D arrays, ignoring rows where either is NaN.
+
+    Args:
+        x (np.ndarray): First variable.
+        y (np.ndarray): Second variable.
+        method (str): One of 'pearson', 'spearman' or 'kendall'. Defaults to 'pearson'.
+
+    Returns:
+        float: The correlation coefficient, or NaN if it is undefined.
+
+    Raises:
+        ValueError: If `method` is not supported.
+    """
+    if method not in CORRELATION_METHODS:
+        raise ValueError(f"Unsupported correlation method '{method}'. Use one of {CORRELATION_METHODS}.")
+
+    if method == 'kendall':
+        return kendall_tau_b(x, y)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    mask = ~(np.isnan(x) | np.isnan(y))
+    values = np.column_stack((x[mask], y[mask]))
+    if len(values) < 2:
+        return np.nan
+    if method == 'spearman':
+        values = rank_columns(values)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return float(np.corrcoef(values, rowvar=False)[0, 1])
+
+
+def correlation_matrix(df: pd.DataFrame, method: str = 'pearson') -> pd.DataFrame:
+    """
+    Computes the correlation matrix of every column of `df`.
+
+    - 'pearson' uses pandas (pairwise complete observations).
+    - 'spearman' ranks all columns at once with `rank_columns` and correlates
+      the ranks with a single matrix product. If the data contains NaNs, the
+      ranks depend on the pair of columns, so pandas' pairwise version is used.
+    - 'kendall' computes tau-b for every pair of columns with `kendall_tau_b`
+      (scipy), which is O(n log n) per pair instead of pandas' O(n^2).
+
+    Args:
+        df (pd.DataFrame): Numeric columns to correlate.
+        method (str): One of 'pearson', 'spearman' or 'kendall'. Defaults to 'pearson'.
+
+    Returns:
+        pd.DataFrame: The correlation matrix, indexed by column name.
+
+    Raises:
+        ValueError: If `method` is not supported.
+    """
+    if method not in CORRELATION_METHODS:
+        raise ValueError(f"Unsupported correlation method '{method}'. Use one of {CORRELATION_METHODS}.")
+
+    if method == 'pearson':
+        return df.corr(method='pearson')
+
+    columns = list(df.columns)
+    values = df.to_numpy(dtype=np.float64)
+
+    if method == 'spearman':
+        if np.isnan(values).any():
+            return df.corr(method='spearman')
+        if len(values) < 2:
+            return pd.DataFrame(np.nan, index=columns, columns=columns)
+        with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)  # Constant columns give NaN
+            matrix = np.corrcoef(rank_columns(values), rowvar=False)
+        return pd.DataFrame(np.atleast_2d(matrix), index=columns, columns=columns)
+
+    matrix = np.eye(len(columns))
+    for i in range(len(columns)):
+        for j in range(i + 1, len(columns)):
+            matrix[i, j] = matrix[j, i] = kendall_tau_b(values[:, i], values[:, j])
+    return pd.DataFrame(matrix, index=columns, columns=columns)
+
+
+def grouped_correlation_matrix(
+        df: pd.DataFrame,
+        group_cols: Union[str, List[str]],
+        columns: List[str],
+        method: str = 'pearson'
+        ) -> pd.DataFrame:
+    """
+    Computes the correlation matrix of `columns` for every group of rows,
+    e.g. for every country, in one call.
+
+    Args:
+        df (pd.DataFrame): Data containing the group and value columns.
+        group_cols (Union[str, List[str]]): Column(s) defining the groups.
+        columns (List[str]): Numeric columns to correlate.
+        method (str): One of 'pearson', 'spearman' or 'kendall'. Defaults to 'pearson'.
+
+    Returns:
+        pd.DataFrame: The stacked matrices, indexed by the group value(s) and
+            the column name, with the same layout as `DataFrame.groupby().corr()`.
+            Empty if `df` has no groups.
+    """
+    if method == 'pearson':
+        return df.groupby(group_cols)[columns].corr()
+
+    matrices = {
+        group: correlation_matrix(group_df[columns], method)
+        for group, group_df in df.groupby(group_cols)
+    }
+    if not matrices:
+        # Same result as the empty `groupby().corr()` of the pearson branch
+        return pd.DataFrame(columns=columns, dtype=np.float64)
+    return pd.concat(matrices)
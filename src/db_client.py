@@ -1,6 +1,7 @@
 import pandas as pd
 import psycopg
 from psycopg import rows
+import psycopg.sql as sql
 import os
 
 class DatabaseClient:
@@ -90,3 +91,84 @@ class DatabaseClient:
                 print("Database connection closed.")
                 
         return df
+
+    def execute(self, query, params=None):
+        """
+        Executes one or more SQL statements that do not return rows (DDL,
+        UPDATE, DELETE...) and commits them.
+
+        Without parameters, a whole SQL script with several statements can be
+        executed in a single call.
+
+        Args:
+            query (str): The SQL statement(s) to be executed.
+            params (tuple or list, optional): A sequence of parameters to
+                                              be used with the query.
+                                              Defaults to None.
+
+        Raises:
+            psycopg.Error: If a database-specific error occurs. The
+                           transaction is rolled back.
+        """
+        conn = None
+
+        try:
+            conn = psycopg.connect(**self.conn_params)
+            with conn.cursor() as cur:
+                print(f"Executing statement(s):\n{query}")
+                cur.execute(query, params)
+            conn.commit()
+            print("Statement(s) committed.")
+        except psycopg.Error as e:
+            print(f"Database error: {e}")
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if conn:
+                conn.close()
+                print("Database connection closed.")
+
+    def copy_csv(self, table, columns, csv_path, chunk_size=1024 * 1024):
+        """
+        Loads a local CSV file into a table with COPY ... FROM STDIN.
+
+        Unlike a server-side COPY ... FROM 'file', the file only needs to be
+        readable by this client, not by the PostgreSQL server.
+
+        Args:
+            table (str): Name of the destination table.
+            columns (list of str): Columns of the table, in the CSV order.
+            csv_path (str): Path of the CSV file. Its first line is a header.
+            chunk_size (int): Number of bytes sent at a time. Defaults to 1 MiB.
+
+        Raises:
+            psycopg.Error: If a database-specific error occurs. The
+                           transaction is rolled back.
+        """
+        copy_query = sql.SQL(
+            "COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, HEADER true, DELIMITER ',', NULL '')"
+        ).format(
+            table=sql.Identifier(table),
+            columns=sql.SQL(', ').join(sql.Identifier(col) for col in columns)
+        )
+        conn = None
+
+        try:
+            conn = psycopg.connect(**self.conn_params)
+            with conn.cursor() as cur, open(csv_path, 'rb') as f:
+                print(f"Copying {csv_path} into {table}...")
+                with cur.copy(copy_query) as copy:
+                    while data := f.read(chunk_size):
+                        copy.write(data)
+                print(f"Copied {cur.rowcount} rows.")
+            conn.commit()
+        except psycopg.Error as e:
+            print(f"Database error: {e}")
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if conn:
+                conn.close()
+                print("Database connection closed.")
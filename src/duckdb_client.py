@@ -0,0 +1,185 @@
+import re
+import threading
+
+import duckdb
+import psycopg.sql as sql
+
+
+def translate_query(query) -> str:
+    """
+    Translates a PostgreSQL query used by the analysis into the DuckDB dialect.
+
+    Only the constructs used by the `get_*_query()` functions are handled:
+    composed `psycopg.sql` objects are rendered to plain strings, `%s`
+    placeholders become `?`, `TO_CHAR(date, 'Mon')` becomes the equivalent
+    `strftime(date, '%b')` and `TABLESAMPLE BERNOULLI (5)` becomes
+    `TABLESAMPLE BERNOULLI (5 PERCENT)`, since DuckDB reads a bare number as
+    a row count. Everything else (CTEs, EXTRACT, CORR, MD5, REPEATABLE...) is
+    already valid in both dialects.
+
+    Args:
+        query (str or psycopg.sql.Composable): The PostgreSQL query.
+
+    Returns:
+        str: The query string ready to be executed by DuckDB.
+    """
+    if isinstance(query, sql.Composable):
+        query = query.as_string()
+
+    # Placeholders first, so the '%' introduced by strftime is not touched
+    query = query.replace('%s', '?')
+    query = re.sub(
+        r"TO_CHAR\(\s*([^,]+?)\s*,\s*'Mon'\s*\)",
+        r"strftime(\1, '%b')",
+        query,
+        flags=re.IGNORECASE
+    )
+    query = re.sub(
+        r"TABLESAMPLE\s+(BERNOULLI|SYSTEM)\s*\(\s*([0-9.]+)\s*\)",
+        r"TABLESAMPLE \1 (\2 PERCENT)",
+        query,
+        flags=re.IGNORECASE
+    )
+    return query
+
+
+class DuckDBClient:
+    """
+    A client class for running the analysis queries on an embedded DuckDB
+    database built from the cleaned data stored in Parquet.
+
+    It exposes the same `get_data` interface as `DatabaseClient`, so it can be
+    passed to any of the plotting functions in place of the PostgreSQL client.
+    No server is required: the Parquet file is exposed as a view named like
+    the PostgreSQL table, and queries run vectorized on all available cores.
+    """
+
+    def __init__(self, parquet_path, table_name='spotify_songs_2024', database=':memory:'):
+        """
+        Initializes the DuckDBClient.
+
+        Args:
+            parquet_path (str): Path (or glob) of the Parquet file(s) holding
+                                the cleaned table.
+            table_name (str): Name under which the data is exposed to the
+                              queries. Defaults to 'spotify_songs_2024'.
+            database (str): DuckDB database file. Defaults to ':memory:'.
+        """
+        self.parquet_path = parquet_path
+        self.table_name = table_name
+        self.database = database
+        self.conn = None
+        self._conn_lock = threading.Lock()
+
+    def _get_connection(self):
+        """
+        Returns the open DuckDB connection, creating it and the table view
+        on first use. Unlike PostgreSQL, an embedded connection is cheap to
+        keep open between queries.
+        """
+        with self._conn_lock:
+            if self.conn is None:
+                self.conn = duckdb.connect(self.database)
+                escaped_path = str(self.parquet_path).replace("'", "''")
+                self.conn.execute(
+                    f"CREATE OR REPLACE VIEW \"{self.table_name}\" AS "
+                    f"SELECT * FROM read_parquet('{escaped_path}')"
+                )
+            return self.conn
+
+    def get_arrow(self, query, params=None):
+        """
+        Executes a SQL query and returns the results as a pyarrow Table.
+
+        DuckDB hands its columnar result over to Arrow without converting it
+        row by row, which makes this the cheapest way to retrieve large results.
+
+        Args:
+            query (str or psycopg.sql.Composable): The PostgreSQL query string
+                                                   to be translated and executed.
+            params (tuple or list, optional): A sequence of parameters to
+                                              be used with the query.
+                                              Defaults to None.
+
+        Returns:
+            pyarrow.Table: A table containing the query results.
+
+        Raises:
+            duckdb.Error: If the query fails.
+        """
+        duckdb_query = translate_query(query)
+        print(f"Executing query:\n{duckdb_query}") # Log the query being executed
+
+        try:
+            table = self._get_connection().cursor().execute(duckdb_query, list(params or ())).fetch_arrow_table()
+        except duckdb.Error as e:
+            print(f"Database error: {e}")
+            raise
+
+        print(f"Fetched {table.num_rows} rows.") # Log the number of rows fetched
+        return table
+
+    def get_data(self, query, params=None):
+        """
+        Executes a SQL query and returns the results as a pandas DataFrame.
+
+        Args:
+            query (str or psycopg.sql.Composable): The PostgreSQL query string
+                                                   to be translated and executed.
+            params (tuple or list, optional): A sequence of parameters to
+                                              be used with the query.
+                                              Defaults to None.
+
+        Returns:
+            pd.DataFrame: A DataFrame containing the query results.
+                          Returns an empty DataFrame if no rows are fetched.
+
+        Raises:
+            duckdb.Error: If the query fails.
+        """
+        duckdb_query = translate_query(query)
+        print(f"Executing query:\n{duckdb_query}") # Log the query being executed
+
+        try:
+            # A cursor per query, since a DuckDB connection cannot be shared
+            # between threads (e.g. by the analytics API)
+            df = self._get_connection().cursor().execute(duckdb_query, list(params or ())).df()
+        except duckdb.Error as e:
+            print(f"Database error: {e}")
+            raise
+
+        print(f"Fetched {len(df)} rows.") # Log the number of rows fetched
+        return df
+
+    def close(self):
+        """
+        Closes the DuckDB connection if it is open.
+        """
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+            print("Database connection closed.")
+
+
+def export_table_to_parquet(db_client, parquet_path, table_name='spotify_songs_2024'):
+    """
+    Copies a cleaned table from PostgreSQL into a Parquet file that can be
+    used by `DuckDBClient`.
+
+    Args:
+        db_client (DatabaseClient): Client connected to the PostgreSQL database.
+        parquet_path (str): Destination Parquet file.
+        table_name (str): Table to export. Defaults to 'spotify_songs_2024'.
+    """
+    query = sql.SQL("SELECT * FROM {table}").format(table=sql.Identifier(table_name))
+    df = db_client.get_data(query)
+
+    conn = duckdb.connect()
+    try:
+        conn.register('export_df', df)
+        escaped_path = str(parquet_path).replace("'", "''")
+        conn.execute(f"COPY export_df TO '{escaped_path}' (FORMAT parquet)")
+    finally:
+        conn.close()
+
+    print(f"Exported {len(df)} rows from {table_name} to {parquet_path}.")
@@ -0,0 +1,176 @@
+import math
+from statistics import NormalDist
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.constants import SAMPLING_METHODS
+
+# Variance of Fisher's z per method, as c / (n - offset): 1 / (n - 3) for
+# Pearson, and the approximations of Fieller, Hartley & Pearson (1957) for
+# the rank methods
+FISHER_Z_VARIANCE = {
+    'pearson': (1.0, 3),
+    'spearman': (1.06, 3),
+    'kendall': (0.437, 4)
+}
+
+
+def resolve_sampling(sampling: Optional[Dict[str, any]]) -> Optional[Dict[str, any]]:
+    """
+    Validates a sampling request and fills in its defaults.
+
+    Args:
+        sampling (Optional[Dict[str, any]]): `None` for an exact computation,
+            or a dictionary with:
+            - 'method': 'bernoulli' (default) or 'system' for `TABLESAMPLE`,
+              or 'stratified' to sample every (country, month) separately.
+            - 'fraction': share of the rows to keep, in (0, 1]; or
+            - 'target_error': desired half-width of the confidence interval
+              of every correlation, from which the sample size is derived.
+            - 'seed': seed of the sample, so reruns see the same rows. Defaults to 42.
+            - 'confidence': level of the intervals. Defaults to 0.95.
+
+    Returns:
+        Optional[Dict[str, any]]: The completed dictionary, or `None`.
+
+    Raises:
+        ValueError: If the method is unknown or not exactly one of
+            'fraction' and 'target_error' is valid.
+    """
+    if sampling is None:
+        return None
+
+    resolved = {'method': 'bernoulli', 'fraction': None, 'target_error': None, 'seed': 42, 'confidence': 0.95}
+    resolved.update(sampling)
+
+    if resolved['method'] not in SAMPLING_METHODS:
+        raise ValueError(f"Unsupported sampling method '{resolved['method']}'. Use one of {SAMPLING_METHODS}.")
+    if (resolved['fraction'] is None) == (resolved['target_error'] is None):
+        raise ValueError("Sampling requires exactly one of 'fraction' and 'target_error'.")
+    if resolved['fraction'] is not None and not 0 < resolved['fraction'] <= 1:
+        raise ValueError(f"Sampling fraction must be in (0, 1], got {resolved['fraction']}.")
+    if resolved['target_error'] is not None and not 0 < resolved['target_error'] < 1:
+        raise ValueError(f"Target error must be in (0, 1), got {resolved['target_error']}.")
+    if not 0 < resolved['confidence'] < 1:
+        raise ValueError(f"Confidence must be in (0, 1), got {resolved['confidence']}.")
+    return resolved
+
+
+def critical_value(confidence: float = 0.95) -> float:
+    """
+    Two-sided critical value of the standard normal distribution.
+
+    Args:
+        confidence (float): Confidence level. Defaults to 0.95.
+
+    Returns:
+        float: e.g. 1.96 for 0.95.
+    """
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def required_sample_size(
+        target_error: float,
+        confidence: float = 0.95,
+        method: str = 'pearson',
+        expected_r: float = 0.0
+        ) -> int:
+    """
+    Number of rows needed for the confidence interval of a correlation to
+    have at most the given half-width.
+
+    Near `expected_r` the interval on r is about (1 - r^2) times as wide as
+    the interval on Fisher's z, so the default r = 0 is the worst case.
+
+    Args:
+        target_error (float): Maximum half-width of the interval on r.
+        confidence (float): Confidence level. Defaults to 0.95.
+        method (str): One of 'pearson', 'spearman' or 'kendall'. Defaults to 'pearson'.
+        expected_r (float): Anticipated correlation. Defaults to 0.
+
+    Returns:
+        int: The sample size.
+    """
+    c, offset = FISHER_Z_VARIANCE[method]
+    z_half_width = target_error / max(1 - expected_r ** 2, 1e-6)
+    return math.ceil(c * (critical_value(confidence) / z_half_width) ** 2) + offset
+
+
+def sample_fraction(required_rows: int, population_rows: int) -> float:
+    """
+    Share of a population to sample so that, on average, `required_rows`
+    rows are kept.
+
+    Args:
+        required_rows (int): Rows needed (see `required_sample_size`).
+        population_rows (int): Rows available.
+
+    Returns:
+        float: The fraction, in (0, 1].
+    """
+    if population_rows <= 0:
+        return 1.0
+    return min(1.0, required_rows / population_rows)
+
+
+def confidence_interval(
+        r: Union[float, np.ndarray, pd.DataFrame],
+        n: Union[int, np.ndarray, pd.DataFrame],
+        confidence: float = 0.95,
+        method: str = 'pearson'
+        ) -> Tuple:
+    """
+    Confidence interval of correlations estimated from `n` rows, computed
+    with Fisher's z transform.
+
+    The intervals assume a simple random sample. That holds for 'bernoulli'
+    samples and for a 'stratified' sample analysed one stratum (country and
+    month) at a time. Pooling a stratified sample across strata, as
+    `df_to_corr_matrix` and `sweep_feature_correlations` do across months,
+    weights the strata unequally because of the minimum rows per stratum,
+    so the interval is only approximate. It is too narrow for 'system',
+    which keeps whole blocks of neighbouring rows.
+
+    Args:
+        r (Union[float, np.ndarray, pd.DataFrame]): Estimated correlation(s).
+        n (Union[int, np.ndarray, pd.DataFrame]): Number of rows behind each
+            estimate, with the same shape as `r`.
+        confidence (float): Confidence level. Defaults to 0.95.
+        method (str): One of 'pearson', 'spearman' or 'kendall'. Defaults to 'pearson'.
+
+    Returns:
+        Tuple: The lower and upper bounds, with the type and shape of `r`.
+            NaN where `n` is too small for an interval.
+    """
+    c, offset = FISHER_Z_VARIANCE[method]
+    r_values = np.asarray(r, dtype=np.float64)
+    n_values = np.asarray(n, dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.arctanh(np.clip(r_values, -1 + 1e-12, 1 - 1e-12))
+        half_width = critical_value(confidence) * np.sqrt(c / (n_values - offset))
+        half_width = np.where(n_values > offset, half_width, np.nan)
+        low, high = np.tanh(z - half_width), np.tanh(z + half_width)
+
+    if isinstance(r, pd.DataFrame):
+        return pd.DataFrame(low, index=r.index, columns=r.columns), pd.DataFrame(high, index=r.index, columns=r.columns)
+    if np.ndim(low) == 0:
+        return float(low), float(high)
+    return low, high
+
+
+def pairwise_counts(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Number of rows where both columns are present, for every pair of columns
+    (the `n` behind each cell of a pairwise correlation matrix).
+
+    Args:
+        df (pd.DataFrame): Numeric columns.
+
+    Returns:
+        pd.DataFrame: The integer count matrix, indexed by column name.
+    """
+    present = df.notna().to_numpy(dtype=np.int64)
+    return pd.DataFrame(present.T @ present, index=df.columns, columns=df.columns)
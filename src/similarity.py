@@ -0,0 +1,402 @@
+import hashlib
+import json
+import os
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+SIMILARITY_FEATURES = ["danceability", "energy", "valence", "tempo", "loudness"]
+
+FEATURES_FILE = 'features.npy'
+TRACK_IDS_FILE = 'track_ids.npy'
+META_FILE = 'meta.json'
+
+
+def deduplicate_tracks(
+        df: pd.DataFrame,
+        feature_cols: List[str] = SIMILARITY_FEATURES,
+        track_col: str = 'spotify_id'
+        ) -> pd.DataFrame:
+    """
+    Collapses chart rows to one row of features per track.
+
+    Audio features are repeated on every daily chart entry of a track. The
+    minimum of its entries is kept, which is exact (unlike a mean, whose
+    rounding depends on the order of the rows) so the fingerprint of the same
+    tracks never changes. Rows with a missing feature are dropped.
+
+    Args:
+        df (pd.DataFrame): Rows containing the track and feature columns.
+        feature_cols (List[str]): Feature columns. Defaults to `SIMILARITY_FEATURES`.
+        track_col (str): Column holding the track identifier. Defaults to 'spotify_id'.
+
+    Returns:
+        pd.DataFrame: The features, indexed by track id in sorted order.
+    """
+    return (
+        df[[track_col] + feature_cols]
+        .dropna()
+        .groupby(track_col, sort=True)[feature_cols]
+        .min()
+    )
+
+
+def tracks_fingerprint(tracks: pd.DataFrame) -> str:
+    """
+    Hashes the tracks and their feature values.
+
+    The fingerprint only changes when a track is added or removed or one of
+    its features changes, so it tells whether a persisted index is still valid.
+
+    Args:
+        tracks (pd.DataFrame): Output of `deduplicate_tracks`.
+
+    Returns:
+        str: The SHA-1 hex digest.
+    """
+    digest = hashlib.sha1(','.join(map(str, tracks.columns)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(tracks, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def build_feature_matrix(tracks: pd.DataFrame) -> tuple:
+    """
+    Standardizes (z-score) the features of every track so that tempo or
+    loudness do not dominate the distance.
+
+    Args:
+        tracks (pd.DataFrame): Output of `deduplicate_tracks`.
+
+    Returns:
+        tuple: The float32 matrix of shape (n_tracks, n_features), the track
+            ids (np.ndarray of str) for its rows, and the mean and standard
+            deviation (np.ndarray of float64) used to standardize it.
+    """
+    values = tracks.to_numpy(dtype=np.float64)
+    mean = values.mean(axis=0) if len(values) else np.zeros(values.shape[1])
+    std = values.std(axis=0) if len(values) else np.ones(values.shape[1])
+    std[std == 0] = 1  # A constant feature does not contribute to the distance
+
+    features = ((values - mean) / std).astype(np.float32)
+    return features, tracks.index.to_numpy(dtype=str), mean, std
+
+
+class SimilarityIndex:
+    """
+    Nearest neighbour index over the standardized audio features of tracks.
+
+    The feature matrix is stored as float32 in a .npy file, so a saved index
+    can be opened with memory mapping. The KD-tree is not saved: it takes
+    milliseconds to build from the matrix, and a pickled tree would carry a
+    second copy of the data. Once built, the tree holds its own float64 copy
+    of the matrix, so memory mapping only defers reading the matrix until the
+    first query. `load_or_build` only rebuilds the matrix when the tracks change.
+    """
+
+    def __init__(
+            self,
+            features: np.ndarray,
+            track_ids: np.ndarray,
+            mean: np.ndarray,
+            std: np.ndarray,
+            feature_cols: List[str],
+            fingerprint: str,
+            tree: Optional[cKDTree] = None,
+            leafsize: int = 16
+            ):
+        """
+        Initializes the index. Use `build`, `load` or `load_or_build` instead
+        of calling it directly.
+
+        Args:
+            features (np.ndarray): Standardized float32 matrix (n_tracks, n_features).
+            track_ids (np.ndarray): Track id of every row of `features`.
+            mean (np.ndarray): Mean of every feature before standardization.
+            std (np.ndarray): Standard deviation of every feature before standardization.
+            feature_cols (List[str]): Feature names, in column order.
+            fingerprint (str): Value of `tracks_fingerprint` for these tracks.
+            tree (Optional[cKDTree]): The KD-tree over `features`, if already
+                built. Otherwise it is built by the first query.
+            leafsize (int): Number of points at which the tree switches to
+                brute force. Defaults to 16.
+        """
+        self.features = features
+        self.track_ids = track_ids
+        self.mean = mean
+        self.std = std
+        self.feature_cols = list(feature_cols)
+        self.fingerprint = fingerprint
+        self._tree = tree
+        self.leafsize = leafsize
+        self._positions = None
+
+    @classmethod
+    def build(
+            cls,
+            df: pd.DataFrame,
+            feature_cols: List[str] = SIMILARITY_FEATURES,
+            track_col: str = 'spotify_id',
+            leafsize: int = 16
+            ) -> 'SimilarityIndex':
+        """
+        Builds the index from chart rows.
+
+        Args:
+            df (pd.DataFrame): Rows containing the track and feature columns,
+                one or many per track (see `deduplicate_tracks`).
+            feature_cols (List[str]): Features defining the similarity.
+                Defaults to `SIMILARITY_FEATURES`.
+            track_col (str): Column holding the track identifier. Defaults to 'spotify_id'.
+            leafsize (int): Number of points at which the tree switches to
+                brute force. Defaults to 16.
+
+        Returns:
+            SimilarityIndex: The new index.
+        """
+        tracks = deduplicate_tracks(df, feature_cols, track_col)
+        features, track_ids, mean, std = build_feature_matrix(tracks)
+        index = cls(features, track_ids, mean, std, feature_cols, tracks_fingerprint(tracks), leafsize=leafsize)
+        index.tree  # Built now, so the cost is not charged to the first query
+        print(f"Similarity index built: {len(track_ids)} tracks x {len(feature_cols)} features.")
+        return index
+
+    def save(self, directory: str) -> None:
+        """
+        Writes the index to `directory` (created if needed).
+
+        Args:
+            directory (str): Destination directory.
+        """
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, META_FILE)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+
+        np.save(os.path.join(directory, FEATURES_FILE), np.ascontiguousarray(self.features, dtype=np.float32))
+        np.save(os.path.join(directory, TRACK_IDS_FILE), self.track_ids)
+
+        # Removed first and written last, so an interrupted save is never
+        # mistaken for a valid index
+        meta = {
+            'fingerprint': self.fingerprint,
+            'feature_cols': self.feature_cols,
+            'mean': self.mean.tolist(),
+            'std': self.std.tolist(),
+            'leafsize': self.leafsize
+        }
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        print(f"Similarity index saved to {directory}.")
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'SimilarityIndex':
+        """
+        Opens an index written by `save`. The tree is only built from the
+        feature matrix by the first query.
+
+        Args:
+            directory (str): Directory of the saved index.
+            mmap (bool): Memory-map the feature matrix instead of reading it.
+                Defaults to True.
+
+        Returns:
+            SimilarityIndex: The index.
+
+        Raises:
+            FileNotFoundError: If no complete index is saved in `directory`.
+        """
+        with open(os.path.join(directory, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+
+        return cls(
+            features=np.load(os.path.join(directory, FEATURES_FILE), mmap_mode='r' if mmap else None),
+            track_ids=np.load(os.path.join(directory, TRACK_IDS_FILE)),
+            mean=np.asarray(meta['mean']),
+            std=np.asarray(meta['std']),
+            feature_cols=meta['feature_cols'],
+            fingerprint=meta['fingerprint'],
+            leafsize=meta.get('leafsize', 16)
+        )
+
+    @classmethod
+    def load_or_build(
+            cls,
+            df: pd.DataFrame,
+            directory: str,
+            feature_cols: List[str] = SIMILARITY_FEATURES,
+            track_col: str = 'spotify_id'
+            ) -> 'SimilarityIndex':
+        """
+        Opens the index saved in `directory` if it was built from the same
+        tracks and features, otherwise builds it again and saves it.
+
+        Args:
+            df (pd.DataFrame): Current rows containing the track and feature columns.
+            directory (str): Directory of the persisted index.
+            feature_cols (List[str]): Features defining the similarity.
+                Defaults to `SIMILARITY_FEATURES`.
+            track_col (str): Column holding the track identifier. Defaults to 'spotify_id'.
+
+        Returns:
+            SimilarityIndex: The up to date index.
+        """
+        fingerprint = tracks_fingerprint(deduplicate_tracks(df, feature_cols, track_col))
+
+        try:
+            index = cls.load(directory)
+            if index.fingerprint == fingerprint:
+                print(f"Similarity index in {directory} is up to date.")
+                return index
+            print(f"Tracks changed since the index in {directory} was built. Rebuilding it...")
+        except (FileNotFoundError, KeyError, ValueError):
+            print(f"No valid similarity index in {directory}. Building it...")
+
+        index = cls.build(df, feature_cols, track_col)
+        index.save(directory)
+        return index
+
+    @property
+    def tree(self) -> cKDTree:
+        """
+        The KD-tree, built from the feature matrix on first use for a loaded index.
+        """
+        if self._tree is None:
+            self._tree = cKDTree(
+                np.asarray(self.features),
+                leafsize=self.leafsize,
+                balanced_tree=False,
+                compact_nodes=False
+            )
+        return self._tree
+
+    def __len__(self) -> int:
+        return len(self.track_ids)
+
+    def standardize(self, values: Union[np.ndarray, pd.DataFrame]) -> np.ndarray:
+        """
+        Standardizes raw feature vectors with the statistics of the index.
+
+        Args:
+            values (Union[np.ndarray, pd.DataFrame]): Array of shape
+                (n, n_features) in `feature_cols` order, or a DataFrame
+                containing those columns.
+
+        Returns:
+            np.ndarray: The standardized float32 vectors.
+        """
+        if isinstance(values, pd.DataFrame):
+            values = values[self.feature_cols]
+        values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+        return ((values - self.mean) / self.std).astype(np.float32)
+
+    def positions(self, track_ids: Sequence[str]) -> np.ndarray:
+        """
+        Returns the row of every track id in the feature matrix.
+
+        Args:
+            track_ids (Sequence[str]): Track ids to look up.
+
+        Returns:
+            np.ndarray: Integer rows.
+
+        Raises:
+            KeyError: If a track is not in the index.
+        """
+        if self._positions is None:
+            self._positions = pd.Index(self.track_ids)
+        positions = self._positions.get_indexer(list(track_ids))
+        if (positions < 0).any():
+            missing = [track_id for track_id, pos in zip(track_ids, positions) if pos < 0]
+            raise KeyError(f"Tracks not in the similarity index: {missing[:5]}")
+        return positions
+
+    def query(
+            self,
+            vectors: np.ndarray,
+            k: int = 10,
+            exclude: Optional[np.ndarray] = None,
+            workers: int = -1
+            ) -> tuple:
+        """
+        Finds the `k` nearest tracks of every standardized vector in one
+        batched tree search.
+
+        Args:
+            vectors (np.ndarray): Standardized vectors of shape (n, n_features).
+            k (int): Number of neighbours per vector. Defaults to 10.
+            exclude (Optional[np.ndarray]): Row to leave out of the results of
+                each vector (e.g. the query track itself), or -1 for none.
+            workers (int): Number of threads for the search, -1 for all CPUs.
+                Defaults to -1.
+
+        Returns:
+            tuple: The (n, k) Euclidean distances and (n, k) rows of the
+                neighbours. Missing neighbours (fewer than k tracks) have an
+                infinite distance and the row `len(self)`.
+        """
+        n_extra = 1 if exclude is not None else 0
+        k_search = min(k + n_extra, len(self))
+        distances, rows = self.tree.query(vectors, k=max(k_search, 1), workers=workers)
+        distances = distances.reshape(len(vectors), -1)
+        rows = rows.reshape(len(vectors), -1)
+
+        if exclude is not None:
+            # Drop the excluded row where it was found, otherwise the farthest neighbour
+            keep = rows != np.asarray(exclude)[:, None]
+            keep[keep.all(axis=1), -1] = False
+            distances = distances[keep].reshape(len(vectors), -1)
+            rows = rows[keep].reshape(len(vectors), -1)
+
+        if rows.shape[1] < k:
+            pad = k - rows.shape[1]
+            distances = np.pad(distances, ((0, 0), (0, pad)), constant_values=np.inf)
+            rows = np.pad(rows, ((0, 0), (0, pad)), constant_values=len(self))
+        return distances[:, :k], rows[:, :k]
+
+    def similar_tracks(self, track_ids: Sequence[str], k: int = 10) -> pd.DataFrame:
+        """
+        Finds the `k` tracks that sound most like each of the given tracks.
+
+        Args:
+            track_ids (Sequence[str]): Query track ids, all present in the index.
+            k (int): Number of neighbours per track. Defaults to 10.
+
+        Returns:
+            pd.DataFrame: One row per (query, neighbour) with 'query_id',
+                'neighbor_rank' (1 = most similar), 'spotify_id' of the
+                neighbour and 'distance' in standard deviations.
+        """
+        positions = self.positions(track_ids)
+        distances, rows = self.query(np.asarray(self.features[positions]), k=k, exclude=positions)
+
+        found = rows < len(self)
+        return pd.DataFrame({
+            'query_id': np.repeat(np.asarray(track_ids, dtype=str), k)[found.ravel()],
+            'neighbor_rank': np.tile(np.arange(1, k + 1), len(positions))[found.ravel()],
+            'spotify_id': self.track_ids[rows[found]],
+            'distance': distances[found]
+        })
+
+
+def join_neighbor_stats(
+        neighbors: pd.DataFrame,
+        track_stats: pd.DataFrame,
+        track_col: str = 'spotify_id'
+        ) -> pd.DataFrame:
+    """
+    Adds the chart performance of every neighbour, e.g. by country.
+
+    Args:
+        neighbors (pd.DataFrame): Output of `SimilarityIndex.similar_tracks`.
+        track_stats (pd.DataFrame): Statistics keyed by `track_col`, for
+            instance the result of `get_track_stats_query` (one row per track
+            and country).
+        track_col (str): Column holding the track identifier. Defaults to 'spotify_id'.
+
+    Returns:
+        pd.DataFrame: The neighbours with the statistics columns. Neighbours
+            without statistics are kept with NaNs.
+    """
+    return neighbors.merge(track_stats, on=track_col, how='left')
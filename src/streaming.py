@@ -0,0 +1,348 @@
+import calendar
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.constants import NUMERIC_COLS
+
+# Columns of the raw Kaggle CSV, in file order (see sql/02_ingest_raw_data.sql)
+CSV_COLUMNS = [
+    "spotify_id", "name", "artists", "daily_rank", "daily_movement", "weekly_movement",
+    "country", "snapshot_date", "popularity", "is_explicit", "duration_ms", "album_name",
+    "album_release_date", "danceability", "energy", "key", "loudness", "mode",
+    "speechiness", "acousticness", "instrumentalness", "liveness", "valence", "tempo",
+    "time_signature"
+]
+
+# Song parameters back-filled from the best row of each spotify_id
+PARAMETER_COLUMNS = [
+    "is_explicit", "duration_ms", "album_name", "album_release_date", "danceability",
+    "energy", "key", "loudness", "mode", "speechiness", "acousticness",
+    "instrumentalness", "liveness", "valence", "tempo", "time_signature"
+]
+
+# Valid ranges used to score rows, as in the validity_score of sql/03
+VALID_RANGES = {
+    "duration_ms": (1, np.inf),
+    "danceability": (0.0, 1.0),
+    "energy": (0.0, 1.0),
+    "key": (-1, 11),
+    "loudness": (-60.0, 0.0),
+    "speechiness": (0.0, 1.0),
+    "acousticness": (0.0, 1.0),
+    "instrumentalness": (0.0, 1.0),
+    "liveness": (0.0, 1.0),
+    "valence": (0.0, 1.0),
+    "tempo": (np.nextafter(0, 1), np.inf),
+    "time_signature": (3, 7),
+}
+
+TRIMMED_COLUMNS = ["album_release_date", "country", "album_name", "name", "artists"]
+BOOLEAN_COLUMNS = ["is_explicit", "mode"]
+
+
+def clean_chunk(raw: pd.DataFrame, first_id: int) -> pd.DataFrame:
+    """
+    Applies the row-level cleaning of sql/03_clean_and_transform_staging.sql
+    (and the integer casts of sql/06) to a chunk of the raw CSV.
+
+    Empty strings become NULL (trimmed first for the text columns), values are
+    cast to their final types (invalid values become NaN instead of failing
+    the cast), booleans become 0/1 and every row receives the `id` the SERIAL
+    column would have given it.
+
+    Args:
+        raw (pd.DataFrame): Chunk read with every column as a string.
+        first_id (int): Id of the first row of the chunk (ids start at 1).
+
+    Returns:
+        pd.DataFrame: The cleaned chunk.
+    """
+    df = pd.DataFrame({'id': np.arange(first_id, first_id + len(raw))}, index=raw.index)
+
+    for col in CSV_COLUMNS:
+        values = raw[col]
+        if col in TRIMMED_COLUMNS:
+            values = values.str.strip()
+        df[col] = values.replace('', np.nan)
+
+    for col in NUMERIC_COLS + ["daily_movement", "weekly_movement"]:
+        if col in BOOLEAN_COLUMNS:
+            lowered = df[col].str.strip().str.lower()
+            df[col] = lowered.map({'true': 1.0, 't': 1.0, '1': 1.0, 'false': 0.0, 'f': 0.0, '0': 0.0})
+        else:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    for col in ["snapshot_date", "album_release_date"]:
+        df[col] = pd.to_datetime(df[col], errors='coerce')
+
+    return df
+
+
+def _date_sort_key(dates: pd.Series) -> np.ndarray:
+    """
+    Returns a sortable integer key for dates ordered DESC as in PostgreSQL,
+    where NULLs come first in descending order (they get the largest key).
+    """
+    key = dates.values.astype('datetime64[D]').astype(np.int64)
+    key[dates.isna().to_numpy()] = np.iinfo(np.int64).max
+    return key
+
+
+def _validity_score(df: pd.DataFrame) -> np.ndarray:
+    """
+    Counts, for every row, the song parameters that are NULL or within their
+    valid range (the validity_score of sql/03).
+    """
+    # is_explicit and mode are always NULL or a boolean once cast
+    score = np.full(len(df), len(BOOLEAN_COLUMNS), dtype=np.int64)
+    for col, (low, high) in VALID_RANGES.items():
+        values = df[col]
+        score += (values.isna() | values.between(low, high)).to_numpy()
+    return score
+
+
+def _keep_best(candidates: pd.DataFrame, key_cols: List[str]) -> pd.DataFrame:
+    """
+    Keeps, for every spotify_id, the row with the largest (key_cols) tuple.
+    """
+    candidates = candidates.sort_values(['spotify_id'] + key_cols)
+    return candidates.drop_duplicates('spotify_id', keep='last')
+
+
+class StreamingStats:
+    """
+    Sufficient statistics of the cleaned data, accumulated in one pass over
+    the CSV, from which the analysis results are derived without a database.
+
+    For every (country, month) group it keeps, for each pair of numeric
+    columns, the number of rows where both are present and the sums of x,
+    x^2 and x*y over those rows. This gives exactly the same pairwise Pearson
+    correlations as `pd.DataFrame.corr()` for any country, month or
+    combination of them. It also keeps the popularity sum and count of every
+    explicit song per country.
+    """
+
+    def __init__(self, columns: List[str]):
+        """
+        Initializes empty statistics.
+
+        Args:
+            columns (List[str]): Numeric columns whose correlations are tracked.
+        """
+        self.columns = list(columns)
+        self.shift = None
+        self.groups: Dict[Tuple[str, int], Dict[str, np.ndarray]] = {}
+        self.explicit_popularity_sums: Optional[pd.DataFrame] = None
+
+    def update(self, df: pd.DataFrame) -> None:
+        """
+        Adds a cleaned chunk to the statistics.
+        """
+        values = df[self.columns].to_numpy(dtype=np.float64)
+        if self.shift is None:
+            # Centering on the first chunk's means keeps the sums of squares
+            # small, which avoids cancellation when computing the variances
+            self.shift = np.nan_to_num(np.nanmean(values, axis=0)) if len(values) else np.zeros(len(self.columns))
+        values = values - self.shift
+
+        valid = ~np.isnan(values)
+        values = np.where(valid, values, 0.0)
+        valid = valid.astype(np.float64)
+
+        months = df['snapshot_date'].dt.month.to_numpy()
+        group_keys = pd.MultiIndex.from_arrays([df['country'].to_numpy(), months])
+        codes, uniques = pd.factorize(group_keys)
+
+        for code, (country, month) in enumerate(uniques):
+            rows = codes == code
+            x, m = values[rows], valid[rows]
+            sums = self.groups.setdefault((country, int(month)), {
+                'n': np.zeros((len(self.columns), len(self.columns))),
+                's': np.zeros((len(self.columns), len(self.columns))),
+                'ss': np.zeros((len(self.columns), len(self.columns))),
+                'cp': np.zeros((len(self.columns), len(self.columns))),
+            })
+            sums['n'] += m.T @ m
+            sums['s'] += x.T @ m
+            sums['ss'] += (x * x).T @ m
+            sums['cp'] += x.T @ x
+
+        explicit = df[(df['is_explicit'] == 1) & (df['country'] != 'ZZ') & df['popularity'].notna()]
+        chunk_sums = explicit.groupby(['country', 'spotify_id'])['popularity'].agg(['sum', 'count'])
+        if self.explicit_popularity_sums is None:
+            self.explicit_popularity_sums = chunk_sums
+        else:
+            self.explicit_popularity_sums = self.explicit_popularity_sums.add(chunk_sums, fill_value=0)
+
+    def _sum_groups(self, country: Optional[str] = None, month: Optional[int] = None) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Adds up the statistics of the groups matching `country` and `month`
+        (`None` matches every value).
+        """
+        selected = [
+            sums for (group_country, group_month), sums in self.groups.items()
+            if (country is None or group_country == country) and (month is None or group_month == month)
+        ]
+        if not selected:
+            return None
+        return {name: sum(sums[name] for sums in selected) for name in ('n', 's', 'ss', 'cp')}
+
+    @staticmethod
+    def _pearson(sums: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Pairwise Pearson correlations from the accumulated sums.
+        """
+        n, s, ss, cp = sums['n'], sums['s'], sums['ss'], sums['cp']
+        covariance = n * cp - s * s.T
+        variance_x = n * ss - s * s
+        variance_y = variance_x.T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = covariance / np.sqrt(variance_x * variance_y)
+        corr[n < 2] = np.nan
+        return np.clip(corr, -1.0, 1.0)
+
+    def corr_matrix(self, country: Optional[str] = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Pearson correlation matrix for one country ('ZZ' for Global) or, if
+        `country` is `None`, for all the rows.
+
+        Args:
+            country (Optional[str]): ISO 3166-1 alpha-2 country code. Defaults to `None`.
+            columns (Optional[List[str]]): Subset of the tracked columns.
+                Defaults to all of them.
+
+        Returns:
+            pd.DataFrame: The correlation matrix, empty if there is no data.
+        """
+        columns = columns or self.columns
+        sums = self._sum_groups(country=country)
+        if sums is None:
+            return pd.DataFrame()
+
+        corr = pd.DataFrame(self._pearson(sums), index=self.columns, columns=self.columns)
+        return corr.loc[columns, columns]
+
+    def monthly_correlations(self, country: str, feature_col: str, target_col: str = 'popularity') -> pd.DataFrame:
+        """
+        Monthly Pearson correlation between two columns for one country, in
+        the same format as the result of `get_monthly_correlation_query`.
+
+        Returns:
+            pd.DataFrame: One row per month with 'month', 'month_name' and
+                'correlation' columns.
+        """
+        i, j = self.columns.index(feature_col), self.columns.index(target_col)
+        rows = []
+        for month in sorted({month for group_country, month in self.groups if group_country == country}):
+            corr = self._pearson(self._sum_groups(country=country, month=month))
+            rows.append({'month': month, 'month_name': calendar.month_abbr[month], 'correlation': corr[i, j]})
+        return pd.DataFrame(rows, columns=['month', 'month_name', 'correlation'])
+
+    def explicit_popularity(self) -> pd.DataFrame:
+        """
+        Average popularity of explicit songs per country, in the same format
+        as the result of `get_explicit_popularity_query`.
+        """
+        sums = self.explicit_popularity_sums
+        if sums is None or sums.empty:
+            return pd.DataFrame(columns=['country', 'avg_explicit_popularity'])
+
+        song_avg = (sums['sum'] / sums['count']).rename('song_avg_popularity').reset_index()
+        result = (song_avg.groupby('country')['song_avg_popularity'].mean()
+                  .rename('avg_explicit_popularity').reset_index())
+        return result.sort_values('avg_explicit_popularity', ascending=False, ignore_index=True)
+
+
+def stream_csv_statistics(
+        csv_path: str,
+        chunksize: int = 200_000,
+        year: Optional[int] = 2024,
+        columns: Optional[List[str]] = None
+        ) -> StreamingStats:
+    """
+    Computes the analysis statistics directly from the raw Kaggle CSV
+    (universal_top_spotify_songs.csv) with bounded memory, without PostgreSQL.
+
+    The file is read twice in chunks:
+
+    1. The best name, artists and song parameters of every spotify_id are
+       selected with the same priorities as sql/03 (non-NULL / validity
+       score, then most recent snapshot_date, then last row). Only one row
+       per song is kept in memory.
+    2. Each chunk is cleaned, back-filled with those values, NULL countries
+       become 'ZZ' (Global), rows without a name are dropped, only `year` is
+       kept (as sql/05 does for 2024) and the chunk is added to the statistics.
+
+    Memory use depends on the chunk size and on the number of distinct songs,
+    not on the number of rows.
+
+    Args:
+        csv_path (str): Path of the raw CSV file.
+        chunksize (int): Number of rows read at a time. Defaults to 200000.
+        year (Optional[int]): Year of snapshot_date to keep. `None` keeps
+            every year. Defaults to 2024.
+        columns (Optional[List[str]]): Numeric columns to track. Defaults to
+            all of them.
+
+    Returns:
+        StreamingStats: The accumulated statistics.
+    """
+    def read_chunks():
+        first_id = 1
+        for raw in pd.read_csv(csv_path, dtype=str, keep_default_na=False, usecols=CSV_COLUMNS, chunksize=chunksize):
+            yield clean_chunk(raw[CSV_COLUMNS], first_id)
+            first_id += len(raw)
+
+    # --- Pass 1: best values per spotify_id ---
+    best_name = best_artists = best_parameters = None
+    n_rows = 0
+    for df in read_chunks():
+        n_rows += len(df)
+        df['date_key'] = _date_sort_key(df['snapshot_date'])
+        df['has_name'] = df['name'].notna()
+        df['has_artists'] = df['artists'].notna()
+        df['validity_score'] = _validity_score(df)
+
+        candidates = [
+            (df[['spotify_id', 'name', 'has_name', 'date_key', 'id']], ['has_name', 'date_key', 'id']),
+            (df[['spotify_id', 'artists', 'has_artists', 'date_key', 'id']], ['has_artists', 'date_key', 'id']),
+            (df[['spotify_id', 'validity_score', 'date_key', 'id'] + PARAMETER_COLUMNS], ['validity_score', 'date_key', 'id']),
+        ]
+        previous = [best_name, best_artists, best_parameters]
+        best_name, best_artists, best_parameters = [
+            _keep_best(pd.concat([best, chunk_candidates]) if best is not None else chunk_candidates, key_cols)
+            for best, (chunk_candidates, key_cols) in zip(previous, candidates)
+        ]
+        print(f"Pass 1: {n_rows} rows read, {len(best_parameters)} songs.")
+
+    stats = StreamingStats(columns or NUMERIC_COLS)
+    if best_parameters is None:
+        print("Warning: The CSV file is empty.")
+        return stats
+
+    best_values = pd.concat([
+        best_name.set_index('spotify_id')[['name']],
+        best_artists.set_index('spotify_id')[['artists']],
+        best_parameters.set_index('spotify_id')[PARAMETER_COLUMNS],
+    ], axis=1)
+
+    # --- Pass 2: clean, back-fill and accumulate ---
+    n_kept = 0
+    for df in read_chunks():
+        backfill = best_values.reindex(df['spotify_id'])
+        for col in best_values.columns:
+            df[col] = backfill[col].to_numpy()
+
+        df['country'] = df['country'].fillna('ZZ')
+        df = df[df['name'].notna() & df['snapshot_date'].notna()]
+        if year is not None:
+            df = df[df['snapshot_date'].dt.year == year]
+
+        n_kept += len(df)
+        if not df.empty:
+            stats.update(df)
+    print(f"Pass 2: {n_kept} cleaned rows added to the statistics.")
+
+    return stats
@@ -0,0 +1,77 @@
+"""
+Cold-start checks for the command line interface.
+
+Each check runs in a fresh interpreter, so modules imported by other tests
+(or by pytest plugins) do not hide a heavy import.
+"""
+import os
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('cartopy', 'seaborn', 'matplotlib')
+
+# Generous enough for slow CI machines, far below the seconds cartopy costs
+HELP_TIME_BUDGET_SECONDS = 1.0
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    """
+    Runs a fresh Python interpreter from the repository root.
+
+    Args:
+        *args (str): Arguments passed to the interpreter.
+
+    Returns:
+        subprocess.CompletedProcess: The finished process, with text output.
+    """
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+
+def loaded_heavy_modules(code: str) -> list:
+    """
+    Runs `code` in a fresh interpreter and lists the heavy modules it loaded.
+
+    Args:
+        code (str): Python statements to execute.
+
+    Returns:
+        list: Names from HEAVY_MODULES found in `sys.modules` afterwards.
+    """
+    check = f"import sys; print('LOADED:' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = run_python('-c', f"{code}\n{check}")
+    loaded = result.stdout.rsplit('LOADED:', 1)[1].strip()
+    return [name for name in loaded.split(',') if name]
+
+
+def test_help_starts_within_budget():
+    start = time.perf_counter()
+    result = run_python('-m', 'scripts.cli', '--help')
+    elapsed = time.perf_counter() - start
+
+    assert 'heatmap' in result.stdout
+    assert elapsed < HELP_TIME_BUDGET_SECONDS, f"--help took {elapsed:.2f}s"
+
+
+def test_help_does_not_import_heavy_modules():
+    code = (
+        "import sys\n"
+        "sys.argv = ['cli', '--help']\n"
+        "import scripts.cli\n"
+        "try:\n"
+        "    scripts.cli.main()\n"
+        "except SystemExit:\n"
+        "    pass"
+    )
+    assert loaded_heavy_modules(code) == []
+
+
+def test_plot_generation_import_does_not_import_heavy_modules():
+    assert loaded_heavy_modules("import scripts.plot_generation") == []
@@ -0,0 +1,86 @@
+"""
+Checks of the correlation engine against pandas and scipy, on data with ties,
+missing values and constant columns.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from src.correlation import (
+    correlation_matrix,
+    grouped_correlation_matrix,
+    kendall_tau_b,
+    pairwise_correlation,
+    rank_columns
+)
+
+
+@pytest.fixture
+def df() -> pd.DataFrame:
+    """
+    500 rows of small integers (many ties), a continuous column and a
+    constant column.
+    """
+    rng = np.random.default_rng(0)
+    ties = rng.integers(0, 5, size=500)
+    return pd.DataFrame({
+        'ties': ties,
+        'noisy_ties': ties + rng.integers(0, 3, size=500),
+        'continuous': rng.normal(size=500),
+        'constant': np.full(500, 7.0)
+    })
+
+
+def test_rank_columns_matches_pandas_average_ranks(df):
+    np.testing.assert_allclose(rank_columns(df.to_numpy(dtype=float)), df.rank().to_numpy())
+
+
+@pytest.mark.parametrize('method', ['pearson', 'spearman', 'kendall'])
+def test_correlation_matrix_matches_pandas(df, method):
+    pd.testing.assert_frame_equal(correlation_matrix(df, method), df.corr(method=method), atol=1e-12)
+
+
+@pytest.mark.parametrize('method', ['spearman', 'kendall'])
+def test_correlation_matrix_with_missing_values_matches_pandas(df, method):
+    df = df.astype(float)
+    df.iloc[::7, 0] = np.nan
+    df.iloc[::11, 2] = np.nan
+    pd.testing.assert_frame_equal(correlation_matrix(df, method), df.corr(method=method), atol=1e-12)
+
+
+def test_kendall_tau_b_matches_scipy_and_ignores_nan(df):
+    x = df['ties'].to_numpy(dtype=float)
+    y = df['noisy_ties'].to_numpy(dtype=float)
+    expected = stats.kendalltau(x, y, variant='b').statistic
+
+    x[::9] = np.nan
+    mask = ~np.isnan(x)
+    expected_with_nan = stats.kendalltau(x[mask], y[mask], variant='b').statistic
+
+    assert kendall_tau_b(df['ties'], df['noisy_ties']) == pytest.approx(expected)
+    assert kendall_tau_b(x, y) == pytest.approx(expected_with_nan)
+
+
+def test_pairwise_spearman_matches_scipy(df):
+    expected = stats.spearmanr(df['ties'], df['continuous']).statistic
+    assert pairwise_correlation(df['ties'], df['continuous'], 'spearman') == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('method', ['pearson', 'spearman', 'kendall'])
+def test_undefined_correlations_are_nan(df, method):
+    assert np.isnan(pairwise_correlation(df['ties'], df['constant'], method))
+    assert np.isnan(pairwise_correlation([1.0], [2.0], method))
+
+
+def test_unknown_method_is_rejected(df):
+    with pytest.raises(ValueError, match='kendal'):
+        pairwise_correlation(df['ties'], df['continuous'], 'kendal')
+    with pytest.raises(ValueError, match='kendal'):
+        correlation_matrix(df, 'kendal')
+
+
+@pytest.mark.parametrize('method', ['pearson', 'spearman', 'kendall'])
+def test_grouped_correlation_matrix_without_groups_is_empty(df, method):
+    result = grouped_correlation_matrix(df.iloc[:0].assign(group=[]), 'group', ['ties', 'continuous'], method)
+    assert result.empty